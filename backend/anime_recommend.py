@@ -1,69 +1,295 @@
 import pickle
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
 import re
+from functools import lru_cache
 
-from model_loader import get_bundle
+from ann_index import STATIC_CANDIDATES, AnnIndex
+from filters import FilterIndex
+from genre_index import GenreIndex
+from metrics import stage_timer
+from model_loader import bundle_version, get_bundle
+from query_index import QueryIndex
+from ranking import merge_seeds, top_n_batch, top_n_indices
+from serialise import RecordBuilder, score_decimals_from_env
+from similarity import TagSimilarity
+from title_index import TitleIndex
+from title_search import TitleSearch
+from topk_index import load_topk_index
 
 # Load anime bundle via shared loader (downloads from GitHub Releases if needed)
 bundle = get_bundle("anime")
 
-model = bundle['model']
+# Times the request pipeline stages (see metrics.py)
+stage = stage_timer("anime")
+
+model = bundle.get('model')
 tfidf = bundle['tfidf']
-scaler = bundle['scaler']
+scaler = bundle.get('scaler')
 anime = bundle['anime']
 tfidf_matrix = bundle['tfidf_matrix']
 normalized_ratings = bundle['normalized_ratings']
 combined_popularity = bundle['combined_popularity']
 
-# Precompute tag similarities
-tag_similarities = cosine_similarity(tfidf_matrix)
+# Tag similarity rows are computed on demand from the sparse TF-IDF matrix
+tag_similarities = TagSimilarity(tfidf_matrix)
+
+# Term -> postings index over the same rows, for free-text queries
+query_index = QueryIndex.from_bundle(bundle, tag_similarities.matrix)
+
+# Approximate tag neighbours for large catalogs (see ann_index.py), if the bundle was built with them
+ann_index = AnnIndex.from_bundle(bundle)
+
+# Genre sets encoded once for vectorised Jaccard similarity
+genre_index = GenreIndex.from_bundle(bundle, anime['genres'])
+
+# Normalised title -> row id, built once, with prefix/fuzzy search for misses
+title_index = TitleIndex.from_bundle(bundle, anime['title'])
+title_search = TitleSearch.from_bundle(bundle, title_index)
+
+def resolve_title(title):
+    """Row of `title`: exact normalised match first, then the closest prefix/fuzzy match."""
+    with stage("lookup"):
+        input_idx = title_index.lookup(title)
+        if input_idx is None:
+            input_idx = title_search.resolve(title)
+    return input_idx
+
+def suggest_titles(query, limit=10):
+    """Autocomplete suggestions for `query` spelled exactly as in the catalog."""
+    return [{'title': anime['title'].iat[row], 'score': score} for row, score in title_search.suggest(query, limit)]
 
 # Clean tag text
 def clean_text(text):
     text = str(text).lower()
     return re.sub(r'[^a-zA-Z0-9\s]', '', text)
 
-# Advanced recommender
-def recommend_anime_advanced(title, top_n=10, weights=(0.2, 0.4, 0.25, 0.15)):
+# Add cleaned tags once at load if the bundle was not built with them (see build_bundle.py)
+if 'cleaned_tags' not in anime.columns:
+    anime['cleaned_tags'] = anime['tags'].fillna('').apply(clean_text)
+
+DEFAULT_WEIGHTS = (0.2, 0.4, 0.25, 0.15)
+
+# Catalog columns returned with each recommendation, read straight from the selected rows
+RESULT_COLUMNS = ['title', 'genres', 'average_rating']
+build_records = RecordBuilder(anime, RESULT_COLUMNS, score_decimals_from_env())
+
+# Precomputed neighbours for the default weights (see build_topk_index.py), if built
+topk_index = load_topk_index("anime", len(anime), DEFAULT_WEIGHTS, bundle_version("anime"))
+
+# Genre, rating and popularity bitmaps for request filters (see filters.py)
+filter_index = FilterIndex(genre_index, anime['average_rating'], combined_popularity, title_index)
+
+def filter_mask(filters):
+    """Mask of the rows passing request `filters`, or None if they keep every row."""
+    with stage("filter"):
+        return filter_index.mask(filters)
+
+# Free-text search: weights of tag relevance, rating and popularity
+DEFAULT_SEARCH_WEIGHTS = (0.7, 0.2, 0.1)
+
+# Final score of every anime against the anime at input_idx
+def compute_scores(input_idx, weights=DEFAULT_WEIGHTS):
+    alpha, beta, gamma, delta = weights
+
+    with stage("genre_sim"):
+        genre_sim = alpha * genre_index.jaccard(input_idx)
+    with stage("tag_sim"):
+        tag_sim = beta * tag_similarities[input_idx]
+
+    with stage("combine"):
+        return (
+            genre_sim +
+            tag_sim +
+            gamma * normalized_ratings +
+            delta * combined_popularity
+        )
+
+# What the ANN index embeds (see build_bundle.py --ann): tag and genre vectors weighted as in the score
+def ann_features(weights=DEFAULT_WEIGHTS):
+    alpha, beta, gamma, delta = weights
+    return [(tag_similarities.matrix, beta), (genre_index.row_vectors(), alpha)]
+
+# The rating and popularity part of the score, added to ANN similarities, and the anime best on it alone,
+# which are re-scored along with every ANN candidate set
+@lru_cache(maxsize=4)
+def static_scores(weights):
+    alpha, beta, gamma, delta = weights
+    scores = gamma * normalized_ratings + delta * combined_popularity
+    return scores, top_n_indices(scores, STATIC_CANDIDATES)
+
+# What the shared cross-domain space describes each anime by (see build_cross_index.py):
+# its tag and genre words, and the rating and popularity part of the score scaled to [0, 1]
+def cross_features(weights=DEFAULT_WEIGHTS):
+    alpha, beta, gamma, delta = weights
+    texts = (anime['cleaned_tags'] + ' ' + anime['genres'].fillna('').astype(str).str.lower()).tolist()
+    return texts, np.asarray(static_scores(tuple(weights))[0], dtype=np.float64) / (gamma + delta)
+
+# Rows worth scoring exactly for input_idx: approximate neighbours plus the static best
+def candidate_rows(input_idx, weights=DEFAULT_WEIGHTS):
+    with stage("ann"):
+        scores, best = static_scores(tuple(weights))
+        return np.union1d(ann_index.neighbours(input_idx, scores), best)
+
+# compute_scores for the anime at `rows` only
+def compute_candidate_scores(input_idx, rows, weights=DEFAULT_WEIGHTS):
+    alpha, beta, gamma, delta = weights
+
+    with stage("genre_sim"):
+        genre_sim = alpha * genre_index.jaccard(input_idx, rows)
+    with stage("tag_sim"):
+        tag_sim = beta * tag_similarities.subset(input_idx, rows)
+
+    with stage("combine"):
+        return (
+            genre_sim +
+            tag_sim +
+            gamma * normalized_ratings[rows] +
+            delta * combined_popularity[rows]
+        )
+
+# compute_scores for several inputs at once: one row of scores per input
+def compute_scores_batch(input_idxs, weights=DEFAULT_WEIGHTS):
     alpha, beta, gamma, delta = weights
 
-    if 'cleaned_tags' not in anime.columns:
-        anime['cleaned_tags'] = anime['tags'].fillna('').apply(clean_text)
+    with stage("genre_sim"):
+        genre_sim = alpha * genre_index.jaccard_many(input_idxs)
+    with stage("tag_sim"):
+        tag_sim = beta * tag_similarities.rows(input_idxs)
+
+    with stage("combine"):
+        return (
+            genre_sim +
+            tag_sim +
+            gamma * normalized_ratings +
+            delta * combined_popularity
+        )
+
+# Final score of every anime against a weighted profile of several seed titles
+def compute_profile_scores(input_idxs, seed_weights, weights=DEFAULT_WEIGHTS):
+    alpha, beta, gamma, delta = weights
+
+    with stage("genre_sim"):
+        genre_sim = alpha * genre_index.profile_jaccard(input_idxs, seed_weights)
+    with stage("tag_sim"):
+        tag_sim = beta * tag_similarities.profile(input_idxs, seed_weights)
+
+    with stage("combine"):
+        return (
+            genre_sim +
+            tag_sim +
+            gamma * normalized_ratings +
+            delta * combined_popularity
+        )
+
+# Advanced recommender
+def rank_anime(input_idx, top_n=10, weights=DEFAULT_WEIGHTS, mask=None):
+    """Rows and scores of the `top_n` best recommendations for the anime at `input_idx`, best first.
+
+    Only rows set in the boolean `mask` (see filter_mask), if given, are considered.
+    """
+    if mask is None and topk_index is not None and topk_index.covers(top_n, weights):
+        with stage("select"):
+            return topk_index.neighbours(input_idx, top_n)
+
+    # Large catalogs: exact scores for the approximate candidates only
+    if ann_index is not None and ann_index.enabled:
+        rows = candidate_rows(input_idx, weights)
+        final_scores = compute_candidate_scores(input_idx, rows, weights)
+        with stage("select"):
+            best = top_n_indices(final_scores, top_n, exclude=np.flatnonzero(rows == input_idx),
+                                 mask=None if mask is None else mask[rows])
+        # Filters or a short candidate list may leave fewer than requested; the whole catalog is scored then
+        if len(best) == top_n:
+            return rows[best], final_scores[best]
 
-    title_lower = title.lower()
-    title_map = anime['title'].str.lower()
+    final_scores = compute_scores(input_idx, weights)
 
-    if title_lower not in title_map.values:
+    # Exclude the input itself and rank only the best candidates
+    with stage("select"):
+        rows = top_n_indices(final_scores, top_n, exclude=input_idx, mask=mask)
+    return rows, final_scores[rows]
+
+def recommend_anime_advanced(title, top_n=10, weights=DEFAULT_WEIGHTS, filters=None):
+    input_idx = resolve_title(title)
+
+    if input_idx is None:
         return {"error": f"❌ '{title}' not found in the dataset."}
 
-    input_idx = title_map[title_map == title_lower].index[0]
+    rows, scores = rank_anime(input_idx, top_n, weights, filter_mask(filters))
+    with stage("serialise"):
+        return build_records(rows, scores)
+
+def recommend_anime_batch(titles, top_n=10, weights=DEFAULT_WEIGHTS, filters=None):
+    """Recommendations for many titles in one pass, one result per title.
+
+    Each result is a list of records, or an error dict if the title is not in
+    the catalog. Tag and genre similarities for all inputs are computed as
+    matrix products and the top-N of every row is selected in bulk.
+    """
+    input_idxs = [resolve_title(title) for title in titles]
+    found = [idx for idx in input_idxs if idx is not None]
+    mask = filter_mask(filters)
+
+    if mask is None and topk_index is not None and topk_index.covers(top_n, weights):
+        with stage("select"):
+            selections = {idx: topk_index.neighbours(idx, top_n) for idx in found}
+    else:
+        selections = top_n_batch(lambda idxs: compute_scores_batch(idxs, weights), found, top_n, len(anime),
+                                 stage=stage, mask=mask)
+
+    with stage("serialise"):
+        records = iter(build_records.batch([selections[idx] for idx in found]))
+    return [
+        {"error": f"❌ '{title}' not found in the dataset."} if idx is None else next(records)
+        for title, idx in zip(titles, input_idxs)
+    ]
+
+def recommend_anime_profile(titles, seed_weights=None, top_n=10, weights=DEFAULT_WEIGHTS, filters=None):
+    """Recommendations for a set of liked titles, scored once against their combined profile.
+
+    The seeds' TF-IDF rows and genre sets are blended (optionally weighted per
+    seed via `seed_weights`) into one profile. The catalog is scored against
+    it with the usual formula and all seeds are excluded from the results.
+    Titles that are not in the catalog are ignored.
+    """
+    input_idxs, seed_weights = merge_seeds([resolve_title(title) for title in titles], seed_weights)
+
+    if len(input_idxs) == 0:
+        return {"error": "❌ None of the given titles were found in the dataset."}
 
-    try:
-        input_genres = set(anime.loc[input_idx, 'genres'].lower().split())
-    except:
-        input_genres = set()
+    mask = filter_mask(filters)
+    final_scores = compute_profile_scores(input_idxs, seed_weights, weights)
 
-    def genre_jaccard(g):
-        try:
-            g_set = set(g.lower().split())
-            return len(input_genres & g_set) / len(input_genres | g_set) if input_genres | g_set else 0
-        except:
-            return 0
+    with stage("select"):
+        rows = top_n_indices(final_scores, top_n, exclude=input_idxs, mask=mask)
+    with stage("serialise"):
+        return build_records(rows, final_scores[rows])
 
-    genre_sim = anime['genres'].apply(genre_jaccard).values
+def search_anime(query, top_n=10, weights=DEFAULT_SEARCH_WEIGHTS, filters=None):
+    """Recommendations for a free-text description such as "dark sci-fi with time travel".
 
-    final_scores = (
-        alpha * genre_sim +
-        beta * tag_similarities[input_idx] +
-        gamma * normalized_ratings +
-        delta * combined_popularity
-    )
+    The query is vectorised with the bundle's TF-IDF vectorizer and only the
+    anime sharing a term with it are scored: their tag similarity to the
+    query blended with rating and popularity. Returns an empty list when no
+    word of the query is in the vocabulary.
+    """
+    relevance, rating, popularity = weights
+    mask = filter_mask(filters)
 
-    results = anime.copy()
-    results['score'] = final_scores
+    with stage("lookup"):
+        query_vector = tfidf.transform([clean_text(query)])
+    with stage("tag_sim"):
+        rows, tag_sim = query_index.similarities(query_vector)
 
-    recommendations = results.drop(index=input_idx).sort_values(by='score', ascending=False)
+    with stage("combine"):
+        scores = (
+            relevance * tag_sim +
+            rating * normalized_ratings[rows] +
+            popularity * combined_popularity[rows]
+        )
 
-    return recommendations[['title', 'genres', 'average_rating', 'score']].head(top_n).reset_index(drop=True).to_dict(orient='records')
+    with stage("select"):
+        best = top_n_indices(scores, top_n, mask=None if mask is None else mask[rows])
+    with stage("serialise"):
+        return build_records(rows[best], scores[best])
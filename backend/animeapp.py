@@ -2,9 +2,15 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 import pickle
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import re
 
+from genre_index import GenreIndex
+from ranking import top_n_indices
+from serialise import RecordBuilder, score_decimals_from_env
+from similarity import TagSimilarity
+from title_index import TitleIndex
+from title_search import TitleSearch
+
 app = Flask(__name__)
 CORS(app)
 
@@ -20,8 +26,18 @@ tfidf_matrix = bundle['tfidf_matrix']
 normalized_ratings = bundle['normalized_ratings']
 combined_popularity = bundle['combined_popularity']
 
-# Precompute tag similarity matrix
-tag_similarities = cosine_similarity(tfidf_matrix)
+# Tag similarity rows are computed on demand from the sparse TF-IDF matrix
+tag_similarities = TagSimilarity(tfidf_matrix)
+
+# Genre sets encoded once for vectorised Jaccard similarity
+genre_index = GenreIndex(anime['genres'])
+
+# Normalised title -> row id, built once, with prefix/fuzzy search for misses
+title_index = TitleIndex(anime['title'])
+title_search = TitleSearch(title_index)
+
+# Catalog columns returned with each recommendation, read straight from the selected rows
+build_records = RecordBuilder(anime, ['title', 'genres'], score_decimals_from_env())
 
 def clean_text(text):
     text = str(text).lower()
@@ -30,31 +46,18 @@ def clean_text(text):
 def recommend_anime_advanced(title, top_n=10, weights=(0.2, 0.4, 0.25, 0.15)):
     alpha, beta, gamma, delta = weights
 
-    title_lower = title.lower()
-    title_map = anime['title'].str.lower()
+    input_idx = title_index.lookup(title)
+    if input_idx is None:
+        input_idx = title_search.resolve(title)
 
-    if title_lower not in title_map.values:
+    if input_idx is None:
         return {"error": f"'{title}' not found in the dataset."}
 
-    input_idx = title_map[title_map == title_lower].index[0]
-
     # Add cleaned tags if missing
     if 'cleaned_tags' not in anime.columns:
         anime['cleaned_tags'] = anime['tags'].fillna('').apply(clean_text)
 
-    try:
-        input_genres = set(anime.loc[input_idx, 'genres'].lower().split())
-    except Exception:
-        input_genres = set()
-
-    def genre_jaccard(g):
-        try:
-            g_set = set(g.lower().split())
-            return len(input_genres & g_set) / len(input_genres | g_set) if input_genres | g_set else 0
-        except Exception:
-            return 0
-
-    genre_sim = anime['genres'].apply(genre_jaccard).values
+    genre_sim = genre_index.jaccard(input_idx)
 
     final_scores = (
         alpha * genre_sim +
@@ -63,11 +66,8 @@ def recommend_anime_advanced(title, top_n=10, weights=(0.2, 0.4, 0.25, 0.15)):
         delta * combined_popularity
     )
 
-    results = anime.copy()
-    results['score'] = final_scores
-    recommendations = results.drop(index=input_idx).sort_values(by='score', ascending=False)
-
-    return recommendations[['title', 'genres', 'score']].head(top_n).reset_index(drop=True).to_dict(orient='records')
+    rows = top_n_indices(final_scores, top_n, exclude=input_idx)
+    return build_records(rows, final_scores[rows])
 
 
 @app.route('/recommend/<string:title>', methods=['GET'])
@@ -0,0 +1,133 @@
+"""Approximate nearest neighbours for the tag-similarity component.
+
+Exact tag similarity touches every TF-IDF row on every request. An
+``AnnIndex`` instead embeds each item's L2-normalised TF-IDF row, together
+with its genre set, into a few dozen dimensions with TruncatedSVD and
+clusters the embeddings with k-means into inverted lists (IVF). Both parts
+are scaled by their weight in the recommender's default formula (see
+``ann_features`` in each recommender module), so the inner product of two
+embeddings approximates the tag and genre part of the final score. A query
+item probes the lists whose centroids are closest to its embedding, ranks
+their items by that approximation plus their rating and popularity part and
+keeps the best as candidates. The recommenders then
+apply the exact scoring formula to the candidates only (see
+``compute_candidate_scores`` in each recommender module), together with the
+best items on rating and popularity alone, which rank high whatever their
+tags and genres.
+
+Built offline by ``build_bundle.py --ann`` and stored in the artifact. Recall
+and latency are traded off at serve time with two knobs:
+
+* ``ANN_PROBES``: inverted lists searched per query (default 8; 0 disables the
+  index and scores exactly)
+* ``ANN_CANDIDATES``: candidates re-scored exactly per query (default 1000)
+
+check_ann.py reports recall@10 against the exact path for given settings.
+"""
+import os
+from typing import Any, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+PROBES_ENV = "ANN_PROBES"
+CANDIDATES_ENV = "ANN_CANDIDATES"
+
+DEFAULT_DIM = 64
+DEFAULT_PROBES = 8
+DEFAULT_CANDIDATES = 1000
+
+# Items ranked on rating and popularity alone that are always re-scored
+STATIC_CANDIDATES = 100
+
+_KEYS = ("embeddings", "centroids", "list_offsets", "list_items")
+
+
+class AnnIndex:
+    """IVF index over reduced tag and genre embeddings (see the module docstring)."""
+
+    def __init__(self, embeddings: np.ndarray, centroids: np.ndarray, list_offsets: np.ndarray,
+                 list_items: np.ndarray, probes: int = DEFAULT_PROBES, candidates: int = DEFAULT_CANDIDATES):
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_items = list_items
+        self.probes = probes
+        self.candidates = candidates
+
+    @property
+    def n_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    @property
+    def enabled(self) -> bool:
+        return self.probes > 0
+
+    @classmethod
+    def build(cls, features: Sequence[Tuple[Any, float]], dim: int = DEFAULT_DIM,
+              n_lists: Optional[int] = None, seed: int = 0) -> "AnnIndex":
+        """Embed and cluster items described by `features`.
+
+        `features` are (matrix, weight) pairs with one L2-normalised row per
+        item, e.g. TF-IDF rows and genre vectors; they are concatenated with
+        each block scaled by the square root of its weight, so inner products
+        weigh each block's cosine similarity by its weight. `n_lists` defaults
+        to about the square root of the number of items. Deterministic for a
+        given `seed`.
+        """
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.decomposition import TruncatedSVD
+
+        matrix = sparse.hstack([sparse.csr_matrix(block) * np.sqrt(weight) for block, weight in features],
+                               format="csr")
+        n_items, n_terms = matrix.shape
+        dim = max(1, min(dim, n_terms - 1, n_items - 1))
+        n_lists = max(1, min(n_lists or int(np.sqrt(n_items)), n_items))
+
+        # Not renormalised: inner products keep approximating the weighted similarities
+        svd = TruncatedSVD(n_components=dim, random_state=seed)
+        embeddings = svd.fit_transform(matrix).astype(np.float32)
+
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, batch_size=4096, n_init=3)
+        labels = kmeans.fit_predict(embeddings)
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+
+        list_items = np.argsort(labels, kind="stable").astype(np.int32)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=n_lists), out=list_offsets[1:])
+        return cls(embeddings, centroids, list_offsets, list_items)
+
+    def to_bundle(self) -> dict:
+        """The index as bundle entries, for build_bundle.py."""
+        return {f"ann_index.{key}": getattr(self, key) for key in _KEYS}
+
+    @classmethod
+    def from_bundle(cls, bundle: Mapping[str, Any]) -> Optional["AnnIndex"]:
+        """The index stored in a built bundle, with the ANN_* knobs applied, or None if it has none."""
+        if "ann_index.embeddings" not in bundle:
+            return None
+        probes = int(os.environ.get(PROBES_ENV, DEFAULT_PROBES))
+        candidates = int(os.environ.get(CANDIDATES_ENV, DEFAULT_CANDIDATES))
+        return cls(*(bundle[f"ann_index.{key}"] for key in _KEYS), probes=probes, candidates=candidates)
+
+    def neighbours(self, idx: int, static: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate neighbours of item `idx` (itself included), in ascending order.
+
+        Items of the ``probes`` closest lists are ranked by embedding
+        similarity plus `static`, a per-item score such as the weighted
+        rating and popularity, and the best ``candidates`` are returned.
+        """
+        probes = min(self.probes, self.n_lists)
+        query = self.embeddings[idx]
+
+        closest = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+        items = np.concatenate([
+            self.list_items[self.list_offsets[c]:self.list_offsets[c + 1]] for c in closest
+        ]).astype(np.intp, copy=False)
+
+        if items.size > self.candidates:
+            approx = self.embeddings[items] @ query
+            if static is not None:
+                approx += static[items]
+            items = items[np.argpartition(-approx, self.candidates - 1)[:self.candidates]]
+        return np.sort(items)
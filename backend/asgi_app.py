@@ -0,0 +1,341 @@
+"""ASGI entry point for the unified API.
+
+Run from the backend/ directory with any ASGI server, e.g.:
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+
+or pre-forked with shared models, as with gunicorn.conf.py:
+
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker "asgi_app:create_prefork_app()"
+
+The event loop only parses requests and serialises responses. The NumPy
+scoring, which releases the GIL, runs on a bounded thread pool, so a slow
+request never blocks the loop:
+
+* Single-title recommendations (``/movies/recommend/?title=``,
+  ``/manga/recommend/?title=``, ``/anime/recommend/<title>``,
+  ``/series/recommend/<title>`` and the legacy ``/recommend/?title=``) are
+  served here directly, with the same bodies, ETags and cache headers as the
+  Flask app, unless they carry filters (see filters.py). Concurrent requests
+  for the same result are coalesced: the first one is scored and the others
+  wait for it instead of scoring the catalog again.
+* Every other route is passed to the Flask app (unified_app.py), which runs
+  on the same thread pool.
+
+At most ``ASGI_MAX_PENDING`` jobs may be running or queued on the pool
+(``ASGI_THREADS`` threads, default: one per CPU). When it is full, new work is
+refused with ``503 Service Unavailable`` and a ``Retry-After`` header instead
+of queueing without bound. Coalesced requests add no work and are never
+refused.
+"""
+import asyncio
+import io
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from werkzeug.http import parse_etags
+
+import domains
+import metrics
+import serialise
+import unified_app
+from domains import DOMAINS
+from filters import FILTER_PARAMS
+from result_cache import etag
+
+THREADS_ENV = "ASGI_THREADS"
+MAX_PENDING_ENV = "ASGI_MAX_PENDING"
+
+# Seconds clients are asked to wait after a 503
+RETRY_AFTER = 1
+
+# Query-string routes: path -> (domain, Flask endpoint, noun for the error message, example)
+_QUERY_ROUTES = {
+    "/movies/recommend/": ("movies", "recommend_movies", "movie", "/movies/recommend/?title=Inception"),
+    "/recommend/": ("movies", "recommend_movies_legacy", "movie", "/movies/recommend/?title=Inception"),
+    "/manga/recommend/": ("manga", "recommend_manga", "manga", "/manga/recommend/?title=Naruto"),
+}
+# Path routes: /anime/recommend/<title>, /series/recommend/<title>
+_PATH_ROUTE = re.compile(r"^/(anime|series)/recommend/([^/]+)$")
+
+
+class Overloaded(Exception):
+    """The thread pool has no room for more work."""
+
+
+class AsyncRecommender:
+    """ASGI application serving recommendations from a bounded thread pool (see the module docstring)."""
+
+    def __init__(self, wsgi_app, threads: Optional[int] = None, max_pending: Optional[int] = None):
+        self.wsgi_app = wsgi_app
+        self.threads = threads or int(os.environ.get(THREADS_ENV, 0)) or os.cpu_count() or 4
+        self.max_pending = max_pending or int(os.environ.get(MAX_PENDING_ENV, 0)) or 8 * self.threads
+        self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="score")
+        self.pending = 0
+        self.coalesced = 0
+        self.rejected = 0
+        # Result cache key -> future of the one computation in flight for it
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        start = time.perf_counter()
+        endpoint, status = "unknown", 500
+        try:
+            route = self._route(scope)
+            if route is None:
+                endpoint = "wsgi"
+                status = await self._call_wsgi(scope, receive, send)
+                return
+            endpoint, domain, title, error = route
+            if error is not None:
+                status = await self._send_json(send, scope, 400, error)
+            else:
+                status = await self._recommend(scope, send, domain, title)
+        except Overloaded:
+            self.rejected += 1
+            status = await self._send_json(send, scope, 503, {"error": "Server is busy, please retry shortly."},
+                                           [(b"retry-after", str(RETRY_AFTER).encode())])
+        finally:
+            # The Flask app records its own requests
+            if endpoint != "wsgi":
+                metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, status=status)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _route(self, scope):
+        """``(endpoint, domain, title, error)`` for a natively served request, else None."""
+        if scope["method"] != "GET":
+            return None
+
+        path = scope["path"]
+        query = parse_qs(scope["query_string"].decode("latin-1"), encoding="utf-8")
+        if any(name in query for name in FILTER_PARAMS):
+            return None
+
+        if path in _QUERY_ROUTES:
+            domain, endpoint, kind, example = _QUERY_ROUTES[path]
+            title = query.get("title", [""])[0]
+            if not title:
+                error = {"error": f"Please provide a {kind} title via the 'title' query parameter.",
+                         "example": example}
+                return endpoint, domain, None, error
+            return endpoint, domain, title, None
+
+        match = _PATH_ROUTE.match(path)
+        if match:
+            domain, title = match.groups()
+            return f"recommend_{domain}", domain, title, None
+        return None
+
+    def _offload(self, function, *args) -> asyncio.Future:
+        """Run `function(*args)` on the thread pool, or raise Overloaded if it is full."""
+        if self.pending >= self.max_pending:
+            raise Overloaded()
+        self.pending += 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        self.pending -= 1
+
+    async def _recommend(self, scope, send, domain, title) -> int:
+        if domains.is_loaded(domain):
+            key = domains.recommend_key(domain, title)
+        else:
+            key = await self._offload(domains.recommend_key, domain, title)
+
+        # Same conditional handling as the Flask app
+        tag = etag(key)
+        cache_headers = [
+            (b"etag", f'"{tag}"'.encode()),
+            (b"cache-control", f"public, max-age={int(domains.result_cache.ttl)}".encode()),
+        ]
+        if tag in parse_etags(_header(scope, b"if-none-match")):
+            return await self._send(send, scope, 304, b"", cache_headers)
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._offload(_score, domain, title)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shielded, so a disconnecting client does not cancel the others' computation
+        result, timings = await asyncio.shield(future)
+
+        if isinstance(result, dict) and "error" in result:
+            return await self._send_json(send, scope, 404, result)
+
+        metrics.start_request()
+        with metrics.stage(DOMAINS[domain].bundle, "serialise"):
+            body = _dumps(result)
+        timings = {**timings, **metrics.finish_request()}
+
+        headers = list(cache_headers)
+        if timings and (unified_app.DEBUG_TIMINGS or _header(scope, b"x-debug-timings") is not None):
+            headers.append((b"server-timing", metrics.server_timing(timings).encode()))
+        return await self._send(send, scope, 200, body, headers, json_body=True)
+
+    async def _send_json(self, send, scope, status, payload, headers=None) -> int:
+        return await self._send(send, scope, status, _dumps(payload), headers or [], json_body=True)
+
+    async def _send(self, send, scope, status, body, headers, json_body=False) -> int:
+        headers = list(headers)
+        if json_body:
+            headers.append((b"content-type", b"application/json"))
+        headers.append((b"content-length", str(len(body)).encode()))
+        headers.extend(_cors_headers(scope))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+        return status
+
+    async def _call_wsgi(self, scope, receive, send) -> int:
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return 499
+            body.extend(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+
+        status, headers, chunks = await self._offload(_run_wsgi, self.wsgi_app, _environ(scope, bytes(body)))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"".join(chunks)})
+        return status
+
+    def stats(self) -> Dict[str, int]:
+        return {"threads": self.threads, "max_pending": self.max_pending, "pending": self.pending,
+                "inflight": len(self._inflight), "coalesced": self.coalesced, "rejected": self.rejected}
+
+
+def _score(domain, title):
+    """``domains.recommend`` with its stage timings, run on a pool thread."""
+    metrics.start_request()
+    try:
+        result = domains.recommend(domain, title)
+    finally:
+        timings = metrics.finish_request()
+    return result, timings
+
+
+def _dumps(payload) -> bytes:
+    # Byte-for-byte what Flask's jsonify produces outside debug mode
+    return serialise.dumps(payload) + b"\n"
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _cors_headers(scope) -> List[Tuple[bytes, bytes]]:
+    # As flask-cors with its defaults: echo the Origin if sent, else allow any
+    origin = _header(scope, b"origin")
+    if origin is None:
+        return [(b"access-control-allow-origin", b"*")]
+    return [(b"access-control-allow-origin", origin.encode("latin-1")), (b"vary", b"Origin")]
+
+
+def _environ(scope, body: bytes) -> dict:
+    """PEP 3333 environ for an ASGI HTTP `scope`."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _run_wsgi(wsgi_app, environ):
+    """Call `wsgi_app` and collect its whole response, on a pool thread."""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+    iterable = wsgi_app(environ, start_response)
+    try:
+        chunks = list(iterable)
+    finally:
+        if hasattr(iterable, "close"):
+            iterable.close()
+    return response["status"], response["headers"], chunks
+
+
+def create_app() -> AsyncRecommender:
+    return AsyncRecommender(unified_app.app)
+
+
+app = create_app()
+
+
+def create_prefork_app() -> AsyncRecommender:
+    """``app`` with every domain loaded and frozen, for pre-fork servers.
+
+    Returns the module-level instance rather than a new one, so each worker
+    runs a single scoring pool and /metrics reports the pool that serves.
+    Its threads start on first use, after the fork.
+    """
+    unified_app.create_prefork_app()
+    return app
+
+
+def _pool_metrics():
+    stats = app.stats()
+    yield "# HELP unirex_async_pending Jobs running or queued on the ASGI scoring pool."
+    yield "# TYPE unirex_async_pending gauge"
+    yield f"unirex_async_pending {stats['pending']}"
+    yield "# HELP unirex_async_requests_total Single-title requests coalesced into another's computation, or refused."
+    yield "# TYPE unirex_async_requests_total counter"
+    yield f'unirex_async_requests_total{{outcome="coalesced"}} {stats["coalesced"]}'
+    yield f'unirex_async_requests_total{{outcome="rejected"}} {stats["rejected"]}'
+
+
+metrics.register_collector(_pool_metrics)
@@ -0,0 +1,232 @@
+"""Offline benchmark of every recommender on synthetic catalogs.
+
+Usage (from the backend/ directory):
+
+    python benchmark.py                                   # all domains at 10k, 100k and 1M rows
+    python benchmark.py movie tv --sizes 10000 100000 --requests 500 -o bench.json
+
+Synthetic bundles with the same keys and schema ``get_bundle`` returns are
+generated once per (domain, size) into --workdir as bundle artifacts, so
+nothing is downloaded. Each (domain, size) then runs in a fresh process that
+measures:
+
+* ``cold_start_s``: artifact load plus the recommender module's import-time
+  precomputation
+* ``latency_ms``: p50/p90/p99/mean of single-title ``recommend_*`` calls on
+  random titles, scored live (the top-K table is not used)
+* ``batch_titles_per_s``: throughput of the ``recommend_*_batch`` function
+* ``peak_rss_mb``: the process's peak resident set size
+
+Results are written as JSON together with the current commit, so runs can be
+compared across commits.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from domains import DOMAINS
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_WORKDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_data")
+
+# bundle name -> (frame key, genre column, popularity key)
+SCHEMAS = {
+    "movie": ("movies", "genres", "normalized_popularity"),
+    "anime": ("anime", "genres", "combined_popularity"),
+    "manga": ("manga", "genre", "normalized_popularity"),
+    "tv": ("tv", "genres", "normalized_popularity"),
+}
+
+DOMAIN_BY_BUNDLE = {domain.bundle: domain for domain in DOMAINS.values()}
+
+GENRES = ["action", "comedy", "drama", "sci-fi", "fantasy", "horror", "romance", "thriller",
+          "mystery", "adventure", "animation", "crime", "documentary", "family", "music"]
+THEME_WORDS = ["space", "alien", "magic", "funny", "sitcom", "intense", "emotional", "story", "fight",
+               "stunt", "futuristic", "technology", "supernatural", "mythology", "workplace", "character"]
+VOCAB_SIZE = 5000
+
+
+def synthetic_bundle(name, n, seed=0):
+    """A bundle shaped like the real `name` bundle, with `n` random catalog rows."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.preprocessing import MinMaxScaler
+
+    frame_key, genre_col, popularity_key = SCHEMAS[name]
+    rng = np.random.default_rng(seed)
+    words = np.array(THEME_WORDS + [f"w{i}" for i in range(VOCAB_SIZE - len(THEME_WORDS))])
+
+    # Tags: 3-12 words per row from a skewed vocabulary, as TF-IDF rows
+    lengths = rng.integers(3, 13, size=n)
+    popularity_of_word = 1.0 / np.arange(1, VOCAB_SIZE + 1)
+    token_ids = rng.choice(VOCAB_SIZE, size=int(lengths.sum()), p=popularity_of_word / popularity_of_word.sum())
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    counts = sparse.csr_matrix((np.ones(len(token_ids)), token_ids, indptr), shape=(n, VOCAB_SIZE))
+    counts.sum_duplicates()
+
+    vectorizer = TfidfVectorizer().fit([" ".join(words)])
+    order = np.array([vectorizer.vocabulary_[w] for w in words])
+    df = np.bincount(counts.indices, minlength=VOCAB_SIZE)
+    idf = np.log((1 + n) / (1 + df)) + 1
+    vectorizer.idf_ = idf[np.argsort(order)]
+
+    weighted = sparse.csr_matrix(counts.multiply(idf[None, :]))
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    tfidf_matrix = sparse.csr_matrix(sparse.diags(1.0 / np.maximum(norms, 1e-12)) @ weighted)
+
+    tags = [" ".join(words[token_ids[indptr[i]:indptr[i + 1]]]) for i in range(n)]
+    genre_counts = rng.integers(0, 4, size=n)
+    genres = [" ".join(rng.choice(GENRES, size=k, replace=False)) for k in genre_counts]
+    frame = pd.DataFrame({
+        "title": [f"Title {i} {words[t]}" for i, t in enumerate(rng.integers(0, 50, size=n))],
+        genre_col: genres,
+        "tags": tags,
+        "average_rating": rng.uniform(1, 10, n).round(1),
+        "popularity": rng.pareto(1.5, n) * 10,
+    })
+
+    scaler = MinMaxScaler()
+    ratings = scaler.fit_transform(frame[["average_rating"]]).ravel()
+    popularity = MinMaxScaler().fit_transform(np.log1p(frame[["popularity"]])).ravel()
+    return {
+        "tfidf": vectorizer,
+        "scaler": scaler,
+        frame_key: frame,
+        "tfidf_matrix": tfidf_matrix,
+        "normalized_ratings": ratings,
+        popularity_key: popularity,
+    }
+
+
+def _artifact_dir(workdir, name, n):
+    return os.path.join(workdir, f"{name}_{n}")
+
+
+def ensure_artifact(workdir, name, n):
+    from bundle_format import is_artifact, save_artifact
+
+    path = _artifact_dir(workdir, name, n)
+    if not is_artifact(path):
+        os.makedirs(workdir, exist_ok=True)
+        save_artifact(synthetic_bundle(name, n), path)
+    return path
+
+
+def _percentiles(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {
+        "p50": float(np.percentile(samples, 50)),
+        "p90": float(np.percentile(samples, 90)),
+        "p99": float(np.percentile(samples, 99)),
+        "mean": float(samples.mean()),
+    }
+
+
+def run_one(name, n, workdir, requests, batch_size):
+    """Measure one (domain, size) in this process; returns its result record."""
+    import model_loader
+    from bundle_format import load_artifact
+
+    domain = DOMAIN_BY_BUNDLE[name]
+    path = _artifact_dir(workdir, name, n)
+
+    start = time.perf_counter()
+    model_loader.set_bundle(name, load_artifact(path))
+    module = importlib.import_module(domain.module)
+    cold_start = time.perf_counter() - start
+
+    module.topk_index = None  # score live, like any non-default request
+    recommend = getattr(module, domain.recommend)
+    batch = getattr(module, domain.batch)
+
+    rng = np.random.default_rng(1)
+    frame = getattr(module, SCHEMAS[name][0])
+    titles = frame["title"].iloc[rng.integers(0, n, size=requests + 5)].tolist()
+
+    for title in titles[:5]:
+        recommend(title)
+    latencies = []
+    for title in titles[5:]:
+        t0 = time.perf_counter()
+        recommend(title)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    batch_titles = frame["title"].iloc[rng.integers(0, n, size=batch_size)].tolist()
+    t0 = time.perf_counter()
+    batch(batch_titles)
+    batch_seconds = time.perf_counter() - t0
+
+    return {
+        "domain": name,
+        "rows": n,
+        "cold_start_s": cold_start,
+        "latency_ms": _percentiles(latencies),
+        "batch_size": batch_size,
+        "batch_titles_per_s": batch_size / batch_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("domains", nargs="*", metavar="domain",
+                        help=f"domains to benchmark (default: all of {', '.join(SCHEMAS)})")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="catalog sizes (default: 10000 100000 1000000)")
+    parser.add_argument("--requests", type=int, default=200, help="single-title requests timed (default: 200)")
+    parser.add_argument("--batch-size", type=int, default=100, help="titles per batch call (default: 100)")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="where synthetic bundles are cached")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.domains) - set(SCHEMAS))
+    if unknown:
+        parser.error(f"unknown domain(s): {', '.join(unknown)}")
+
+    if args.child:
+        name, n = args.domains[0], args.sizes[0]
+        print(json.dumps(run_one(name, n, args.workdir, args.requests, args.batch_size)))
+        return
+
+    results = []
+    for n in args.sizes:
+        for name in args.domains or SCHEMAS:
+            ensure_artifact(args.workdir, name, n)
+            # A fresh process per run, so cold start and peak RSS are not shared
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), name, "--child", "--sizes", str(n),
+                 "--requests", str(args.requests), "--batch-size", str(args.batch_size),
+                 "--workdir", args.workdir],
+                capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{name} {n}: cold start {result['cold_start_s']:.2f}s, "
+                  f"p50 {result['latency_ms']['p50']:.2f}ms, p99 {result['latency_ms']['p99']:.2f}ms, "
+                  f"batch {result['batch_titles_per_s']:.0f} titles/s, peak RSS {result['peak_rss_mb']:.0f}MB")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"commit": _commit(), "python": platform.python_version(), "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Build serving-optimised bundle artifacts from raw recommender bundles.
+
+Usage (from the backend/ directory):
+
+    python build_bundle.py                                         # all bundles
+    python build_bundle.py movie --source movie_recommender_bundle2_backup.pkl
+    python build_bundle.py tv anime --float32 -k 100
+    python build_bundle.py manga --ann --ann-dim 64 --ann-lists 1000
+
+For each bundle the raw pickle (the local or downloaded bundle, or --source)
+is loaded, its recommender module derives the serving state from it exactly
+as it would at startup, and the result is written to the artifact directory
+that ``model_loader.get_bundle`` prefers (format in bundle_format.py):
+
+* the L2-normalised TF-IDF matrix
+* genre encodings, the title hash index and the trigram title search index
+* the term -> postings index for free-text search (see query_index.py)
+* the catalog frame including its ``cleaned_tags`` column
+* with --float32, float32 score arrays and TF-IDF values
+* with --ann, the approximate tag-neighbour index (see ann_index.py)
+* with -k, the top-K neighbour table (see build_topk_index.py)
+
+Objects the recommenders never read (the sentence-transformer model and its
+tokenizer) are left out. The output depends only on the source bundle and
+the options; both are recorded in the artifact's ``meta.json`` together with
+a version derived from them.
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import pickle
+import sys
+import time
+import types
+
+import numpy as np
+from scipy import sparse
+
+# Minimal stub so pickle can load old bundles that reference sentence_transformers.model_card
+st_model_card_module = "sentence_transformers.model_card"
+if st_model_card_module not in sys.modules:
+    model_card_module = types.ModuleType(st_model_card_module)
+
+    class ModelCard:  # type: ignore
+        pass
+
+    class SentenceTransformerModelCardData:  # type: ignore
+        pass
+
+    def generate_model_card(*args, **kwargs):  # type: ignore
+        return None
+
+    model_card_module.ModelCard = ModelCard  # type: ignore[attr-defined]
+    model_card_module.SentenceTransformerModelCardData = SentenceTransformerModelCardData  # type: ignore[attr-defined]
+    model_card_module.generate_model_card = generate_model_card  # type: ignore[attr-defined]
+
+    sys.modules[st_model_card_module] = model_card_module
+
+# Stub legacy BERT attention class so pickle can resolve it
+bert_module_name = "transformers.models.bert.modeling_bert"
+try:
+    bert_module = __import__(bert_module_name, fromlist=["*"])
+    if not hasattr(bert_module, "BertSdpaSelfAttention"):
+        class BertSdpaSelfAttention:  # type: ignore
+            pass
+
+        setattr(bert_module, "BertSdpaSelfAttention", BertSdpaSelfAttention)
+except Exception:
+    # If this fails, we'll just let pickle raise a clearer error
+    pass
+
+import model_loader
+from ann_index import DEFAULT_DIM, AnnIndex
+from bundle_format import save_artifact
+from domains import DOMAINS
+from topk_index import build_topk_index
+
+# Bumped whenever the derived state written by this script changes
+BUILD_VERSION = 1
+
+# Logical bundle name -> recommender module that derives its serving state
+DOMAIN_MODULES = {domain.bundle: domain.module for domain in DOMAINS.values()}
+
+# Heavy objects that aren't used by any recommender module
+UNUSED_KEYS = ("model", "sentence_model", "tokenizer")
+
+
+def _as_float32(bundle):
+    """Float64 score arrays and sparse matrices of `bundle` converted to float32."""
+    compact = {}
+    for key, value in bundle.items():
+        if (isinstance(value, np.ndarray) or sparse.issparse(value)) and value.dtype == np.float64:
+            value = value.astype(np.float32)
+        compact[key] = value
+    return compact
+
+
+def build(name, source_path, float32=False, k=None, ann=False, ann_dim=DEFAULT_DIM, ann_lists=None):
+    """Build the artifact for bundle `name` from the pickle at `source_path`; returns its build record."""
+    with open(source_path, "rb") as f:
+        raw = pickle.load(f)
+    raw = {key: value for key, value in raw.items() if key not in UNUSED_KEYS}
+
+    # The recommender module derives everything from the raw bundle as it would at startup
+    model_loader.set_bundle(name, raw)
+    module = importlib.import_module(DOMAIN_MODULES[name])
+    n_items = len(module.tag_similarities)
+
+    bundle = dict(raw)  # the catalog frame now carries cleaned_tags
+    bundle["tfidf_matrix"] = module.tag_similarities.matrix
+    bundle.update(module.genre_index.to_bundle())
+    bundle.update(module.title_index.to_bundle(n_items))
+    bundle.update(module.title_search.to_bundle())
+    bundle.update(module.query_index.to_bundle())
+    if ann:
+        bundle.update(AnnIndex.build(module.ann_features(), ann_dim, ann_lists).to_bundle())
+    if float32:
+        bundle = _as_float32(bundle)
+
+    record = {
+        "builder_version": BUILD_VERSION,
+        "bundle": name,
+        "source_sha256": model_loader.sha256_file(source_path),
+        "options": {"float32": bool(float32)},
+    }
+    if ann:
+        record["options"]["ann"] = {"dim": ann_dim, "lists": ann_lists}
+    if k:
+        record["options"]["k"] = k
+    record["version"] = hashlib.sha256(json.dumps(record, sort_keys=True).encode()).hexdigest()[:16]
+    save_artifact(bundle, model_loader.artifact_path(name), record)
+
+    if k:
+        build_topk_index(name, module.compute_scores, n_items, k, module.DEFAULT_WEIGHTS, record["version"])
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("bundles", nargs="*", metavar="bundle",
+                        help=f"bundles to build (default: all of {', '.join(DOMAIN_MODULES)})")
+    parser.add_argument("--source", help="raw bundle pickle to build from (only with a single bundle)")
+    parser.add_argument("--float32", action="store_true", help="store score arrays and TF-IDF values as float32")
+    parser.add_argument("-k", type=int, default=None, help="also build the top-K neighbour table with K neighbours")
+    parser.add_argument("--ann", action="store_true", help="also build the approximate tag-neighbour index")
+    parser.add_argument("--ann-dim", type=int, default=DEFAULT_DIM,
+                        help=f"embedding dimensions of the ANN index (default: {DEFAULT_DIM})")
+    parser.add_argument("--ann-lists", type=int, default=None,
+                        help="inverted lists of the ANN index (default: about sqrt of the catalog size)")
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.bundles) - set(DOMAIN_MODULES))
+    if unknown:
+        parser.error(f"unknown bundle(s): {', '.join(unknown)}")
+    if args.source and len(args.bundles) != 1:
+        parser.error("--source needs exactly one bundle name")
+
+    for name in args.bundles or DOMAIN_MODULES:
+        start = time.perf_counter()
+        source_path = args.source or model_loader._download_if_needed(name)
+        record = build(name, source_path, float32=args.float32, k=args.k,
+                       ann=args.ann, ann_dim=args.ann_dim, ann_lists=args.ann_lists)
+        print(f"{name}: {source_path} -> {model_loader.artifact_path(name)} "
+              f"version {record['version']} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Build the embedding space shared by all domains for cross-domain recommendations.
+
+Usage (from the backend/ directory):
+
+    python build_cross_index.py                # all domains, 128 dimensions
+    python build_cross_index.py --dim 64
+
+Every domain's bundle is loaded and described by its recommender module's
+``cross_features``; the result (see cross_index.py) is written next to the
+bundles and served by ``/cross/recommend``. Rebuild after rebuilding any
+bundle: the space is only used with the bundles it was built from.
+"""
+import argparse
+import importlib
+import time
+
+import model_loader
+from cross_index import DEFAULT_DIM, build_cross_index
+from domains import DOMAINS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM,
+                        help=f"dimensions of the shared space (default: {DEFAULT_DIM})")
+    args = parser.parse_args()
+
+    features, versions = {}, {}
+    for domain in DOMAINS.values():
+        module = importlib.import_module(domain.module)
+        features[domain.bundle] = module.cross_features()
+        versions[domain.bundle] = model_loader.bundle_version(domain.bundle)
+
+    start = time.perf_counter()
+    path = build_cross_index(features, versions, args.dim)
+    sizes = ", ".join(f"{name} {len(texts)}" for name, (texts, _) in features.items())
+    print(f"{sizes} -> {path} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Precompute top-K neighbour tables for the recommenders' default weights.
+
+Usage (from the backend/ directory):
+
+    python build_topk_index.py                 # all domains, K=100
+    python build_topk_index.py movie tv -k 50
+
+Each domain gets ``<name>_topk_neighbors.npy`` (int32) and
+``<name>_topk_scores.npy`` (float32) next to its bundle. The recommenders
+memory-map these at import time and answer default-weight requests with
+``top_n <= K`` from a single row slice, as long as the bundle is the one the
+table was built from.
+"""
+import argparse
+import importlib
+import time
+
+import model_loader
+from domains import DOMAINS
+from topk_index import build_topk_index
+
+# Logical bundle name -> recommender module that scores it
+DOMAIN_MODULES = {domain.bundle: domain.module for domain in DOMAINS.values()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("domains", nargs="*", metavar="domain",
+                        help=f"domains to index (default: all of {', '.join(DOMAIN_MODULES)})")
+    parser.add_argument("-k", type=int, default=100, help="neighbours to keep per item (default: 100)")
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.domains) - set(DOMAIN_MODULES))
+    if unknown:
+        parser.error(f"unknown domain(s): {', '.join(unknown)}")
+
+    for name in args.domains or DOMAIN_MODULES:
+        module = importlib.import_module(DOMAIN_MODULES[name])
+        n_items = module.tag_similarities.shape[0]
+
+        start = time.perf_counter()
+        path = build_topk_index(name, module.compute_scores, n_items, args.k, module.DEFAULT_WEIGHTS,
+                                model_loader.bundle_version(name))
+        print(f"{name}: {n_items} items, K={args.k} -> {path} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""Columnar, memory-mappable on-disk format for recommender bundles.
+
+A bundle artifact is a directory holding a ``meta.json`` manifest plus one
+``.npy`` file per array, so nothing has to be unpickled at startup and every
+numeric array is opened with ``np.load(mmap_mode='r')``: pages are read lazily
+and shared between processes serving the same files.
+
+Entries of the original pickle are stored by type:
+
+* numpy arrays                -> ``<key>.npy``
+* scipy sparse matrices       -> CSR ``<key>.data/.indices/.indptr.npy``
+* DataFrames                  -> one file per column; numeric columns as plain
+                                 arrays, string columns as an int64 offsets
+                                 array plus a uint8 UTF-8 buffer
+* lists of strings            -> offsets array plus a uint8 UTF-8 buffer
+* ``TfidfVectorizer``         -> constructor params, vocabulary (as a string
+                                 buffer in feature order) and ``idf_``
+* other fitted estimators     -> constructor params and fitted ``*_``
+                                 attributes (e.g. the rating scaler)
+
+Only numeric data stays in the memory maps. String columns and lists are
+stored compactly but decoded into Python ``str`` objects at load (see
+``load_artifact``), so every process holds its own copy of the catalog text.
+
+Anything else (the sentence-transformer ``model`` of older bundles) is dropped;
+the recommenders read those keys with ``bundle.get``. build_bundle.py writes
+these artifacts, adding the derived serving state (genre encodings, title
+indexes, cleaned tags) and a ``build`` record with a version to ``meta.json``.
+"""
+import importlib
+import json
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+
+
+def is_artifact(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+# ---------------------------------------------------------------------------
+# Strings: offsets + UTF-8 buffer, with a validity mask for missing values
+# ---------------------------------------------------------------------------
+
+def _save_strings(path: str, prefix: str, values) -> None:
+    encoded = [v.encode("utf-8") if isinstance(v, str) else b"" for v in values]
+    valid = np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(encoded))
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    chars = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    np.save(os.path.join(path, f"{prefix}.offsets.npy"), offsets)
+    np.save(os.path.join(path, f"{prefix}.chars.npy"), chars)
+    np.save(os.path.join(path, f"{prefix}.valid.npy"), valid)
+
+
+def _load_strings(path: str, prefix: str) -> List[Any]:
+    offsets = np.load(os.path.join(path, f"{prefix}.offsets.npy"))
+    valid = np.load(os.path.join(path, f"{prefix}.valid.npy"))
+    buffer = np.load(os.path.join(path, f"{prefix}.chars.npy"), mmap_mode="r").tobytes()
+
+    bounds = offsets.tolist()
+    return [
+        buffer[bounds[i]:bounds[i + 1]].decode("utf-8") if ok else np.nan
+        for i, ok in enumerate(valid.tolist())
+    ]
+
+
+# ---------------------------------------------------------------------------
+# JSON-safe encoding of estimator params / scalar attributes
+# ---------------------------------------------------------------------------
+
+def _encode_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray) and value.dtype == object:
+        # e.g. feature_names_in_ of a fitted scaler
+        return {"__objects__": [_encode_value(v) for v in value.tolist()]}
+    if isinstance(value, tuple):
+        return {"__tuple__": [_encode_value(v) for v in value]}
+    if isinstance(value, (list, set, frozenset)):
+        return [_encode_value(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _encode_value(v) for k, v in value.items()}
+    if isinstance(value, type) and issubclass(value, np.generic):
+        return {"__dtype__": np.dtype(value).name}
+    raise ValueError(f"Cannot store value of type {type(value).__name__} in a bundle artifact")
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_decode_value(v) for v in value]
+    if isinstance(value, dict):
+        if "__tuple__" in value:
+            return tuple(_decode_value(v) for v in value["__tuple__"])
+        if "__objects__" in value:
+            return np.array(_decode_value(value["__objects__"]), dtype=object)
+        if "__dtype__" in value:
+            return np.dtype(value["__dtype__"]).type
+        return {k: _decode_value(v) for k, v in value.items()}
+    return value
+
+
+def _class_path(obj: Any) -> str:
+    return f"{type(obj).__module__}.{type(obj).__qualname__}"
+
+
+def _import_class(path: str):
+    module, _, name = path.rpartition(".")
+    return getattr(importlib.import_module(module), name)
+
+
+# ---------------------------------------------------------------------------
+# Per-entry writers / readers
+# ---------------------------------------------------------------------------
+
+def _save_column(path: str, prefix: str, series: pd.Series) -> Dict[str, Any]:
+    spec = {"name": series.name, "dtype": str(series.dtype)}
+    values = series.to_numpy()
+
+    if values.dtype.kind in "biufcmM":
+        spec["kind"] = "array"
+        np.save(os.path.join(path, f"{prefix}.npy"), np.ascontiguousarray(values))
+    elif all(isinstance(v, str) for v in series.dropna()):
+        spec["kind"] = "string"
+        _save_strings(path, prefix, series.tolist())
+    else:
+        # Rare mixed/object columns keep their Python objects; they are not memory-mapped
+        spec["kind"] = "object"
+        np.save(os.path.join(path, f"{prefix}.npy"), values.astype(object), allow_pickle=True)
+    return spec
+
+
+def _load_column(path: str, prefix: str, spec: Dict[str, Any]) -> pd.Series:
+    if spec["kind"] == "array":
+        return pd.Series(np.load(os.path.join(path, f"{prefix}.npy"), mmap_mode="r"), copy=False)
+    if spec["kind"] == "string":
+        dtype = object if spec["dtype"] == "object" else spec["dtype"]
+        return pd.Series(_load_strings(path, prefix), dtype=dtype)
+    return pd.Series(np.load(os.path.join(path, f"{prefix}.npy"), allow_pickle=True), dtype=object)
+
+
+def _save_frame(path: str, key: str, frame: pd.DataFrame) -> Dict[str, Any]:
+    columns = [_save_column(path, f"{key}.col{i}", frame.iloc[:, i]) for i in range(frame.shape[1])]
+
+    index = None
+    if not frame.index.equals(pd.RangeIndex(len(frame))):
+        index = _save_column(path, f"{key}.index", frame.index.to_series(index=None))
+        index["name"] = frame.index.name
+
+    return {"type": "frame", "n_rows": len(frame), "columns": columns, "index": index}
+
+
+def _load_frame(path: str, key: str, spec: Dict[str, Any]) -> pd.DataFrame:
+    data = {
+        column["name"]: _load_column(path, f"{key}.col{i}", column)
+        for i, column in enumerate(spec["columns"])
+    }
+    frame = pd.DataFrame(data, copy=False)
+    if spec["index"] is not None:
+        frame.index = pd.Index(_load_column(path, f"{key}.index", spec["index"]), name=spec["index"]["name"])
+    return frame
+
+
+def _save_csr(path: str, key: str, matrix) -> Dict[str, Any]:
+    csr = sparse.csr_matrix(matrix).sorted_indices()
+    for part in ("data", "indices", "indptr"):
+        np.save(os.path.join(path, f"{key}.{part}.npy"), getattr(csr, part))
+    return {"type": "csr", "shape": list(csr.shape)}
+
+
+def _load_csr(path: str, key: str, spec: Dict[str, Any]) -> sparse.csr_matrix:
+    data, indices, indptr = (
+        np.load(os.path.join(path, f"{key}.{part}.npy"), mmap_mode="r") for part in ("data", "indices", "indptr")
+    )
+    return sparse.csr_matrix((data, indices, indptr), shape=tuple(spec["shape"]), copy=False)
+
+
+def _save_tfidf(path: str, key: str, vectorizer) -> Dict[str, Any]:
+    terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    _save_strings(path, f"{key}.vocabulary", terms)
+    if vectorizer.use_idf:
+        np.save(os.path.join(path, f"{key}.idf.npy"), vectorizer.idf_)
+
+    params = vectorizer.get_params(deep=False)
+    if any(callable(params[p]) and not isinstance(params[p], type) for p in ("preprocessor", "tokenizer", "analyzer")):
+        raise ValueError(f"{key}: TfidfVectorizer with custom callables cannot be stored in a bundle artifact")
+
+    return {
+        "type": "tfidf",
+        "class": _class_path(vectorizer),
+        "params": _encode_value(params),
+        "fixed_vocabulary": bool(vectorizer.fixed_vocabulary_),
+    }
+
+
+def _load_tfidf(path: str, key: str, spec: Dict[str, Any]):
+    from sklearn.feature_extraction.text import TfidfTransformer
+
+    vectorizer = _import_class(spec["class"])(**_decode_value(spec["params"]))
+    terms = _load_strings(path, f"{key}.vocabulary")
+    vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms)}
+    vectorizer.fixed_vocabulary_ = spec["fixed_vocabulary"]
+
+    if vectorizer.use_idf:
+        vectorizer.idf_ = np.load(os.path.join(path, f"{key}.idf.npy"))
+    else:
+        vectorizer._tfidf = TfidfTransformer(norm=vectorizer.norm, use_idf=False,
+                                             sublinear_tf=vectorizer.sublinear_tf)
+        vectorizer._tfidf.fit(sparse.csr_matrix((1, len(terms))))
+    return vectorizer
+
+
+def _save_estimator(path: str, key: str, estimator) -> Dict[str, Any]:
+    attributes, arrays = {}, []
+    for name, value in vars(estimator).items():
+        if not name.endswith("_") or name.startswith("_"):
+            continue
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            np.save(os.path.join(path, f"{key}.{name}.npy"), value)
+            arrays.append(name)
+        else:
+            attributes[name] = _encode_value(value)
+
+    return {
+        "type": "estimator",
+        "class": _class_path(estimator),
+        "params": _encode_value(estimator.get_params(deep=False)),
+        "attributes": attributes,
+        "arrays": arrays,
+    }
+
+
+def _load_estimator(path: str, key: str, spec: Dict[str, Any]):
+    estimator = _import_class(spec["class"])(**_decode_value(spec["params"]))
+    for name, value in spec["attributes"].items():
+        setattr(estimator, name, _decode_value(value))
+    for name in spec["arrays"]:
+        setattr(estimator, name, np.load(os.path.join(path, f"{key}.{name}.npy")))
+    return estimator
+
+
+# ---------------------------------------------------------------------------
+# Whole bundles
+# ---------------------------------------------------------------------------
+
+def _entry_kind(value: Any) -> Optional[str]:
+    if isinstance(value, pd.DataFrame):
+        return "frame"
+    if sparse.issparse(value):
+        return "csr"
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        return "array"
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return "strings"
+    if type(value).__name__ == "TfidfVectorizer" and hasattr(value, "vocabulary_"):
+        return "tfidf"
+    if hasattr(value, "get_params") and type(value).__module__.startswith("sklearn."):
+        return "estimator"
+    return None
+
+
+def save_artifact(bundle: Dict[str, Any], path: str, build: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Write `bundle` as an artifact directory at `path`; returns the dropped keys.
+
+    `build` (JSON-serialisable) is recorded in the manifest as is. The
+    directory is written next to `path` first and moved into place when
+    complete, so readers never see a half-written artifact.
+    """
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    entries, dropped = {}, []
+    for key, value in bundle.items():
+        kind = _entry_kind(value)
+        if kind == "frame":
+            entries[key] = _save_frame(tmp_path, key, value)
+        elif kind == "csr":
+            entries[key] = _save_csr(tmp_path, key, value)
+        elif kind == "array":
+            np.save(os.path.join(tmp_path, f"{key}.npy"), np.ascontiguousarray(value))
+            entries[key] = {"type": "array"}
+        elif kind == "strings":
+            _save_strings(tmp_path, key, value)
+            entries[key] = {"type": "strings"}
+        elif kind == "tfidf":
+            entries[key] = _save_tfidf(tmp_path, key, value)
+        elif kind == "estimator":
+            entries[key] = _save_estimator(tmp_path, key, value)
+        else:
+            dropped.append(key)
+
+    with open(os.path.join(tmp_path, META_FILE), "w") as f:
+        meta = {"format_version": FORMAT_VERSION, "build": build, "entries": entries, "dropped": dropped}
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return dropped
+
+
+def read_meta(path: str) -> Dict[str, Any]:
+    """The ``meta.json`` manifest of the artifact at `path`."""
+    with open(os.path.join(path, META_FILE)) as f:
+        return json.load(f)
+
+
+def load_artifact(path: str) -> Dict[str, Any]:
+    """Open the artifact directory at `path` as a bundle dict with the original keys.
+
+    Arrays, sparse matrix parts and numeric frame columns are read-only memory
+    maps, whose pages are shared by every process mapping the same files.
+    String columns (titles, genres, tags), string lists and the vectorizer
+    vocabulary are decoded into Python strings instead: each process holds a
+    private copy of them, and forked workers dirty the pages they sit on as
+    soon as reference counts change. Their RSS is not shared.
+    """
+    meta = read_meta(path)
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle artifact version {meta.get('format_version')} at {path}")
+
+    loaders = {
+        "frame": _load_frame,
+        "csr": _load_csr,
+        "array": lambda p, k, s: np.load(os.path.join(p, f"{k}.npy"), mmap_mode="r"),
+        "strings": lambda p, k, s: _load_strings(p, k),
+        "tfidf": _load_tfidf,
+        "estimator": _load_estimator,
+    }
+    return {key: loaders[spec["type"]](path, key, spec) for key, spec in meta["entries"].items()}
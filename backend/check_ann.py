@@ -0,0 +1,112 @@
+"""Report recall@N and latency of the approximate tag-neighbour path against exact scoring.
+
+Usage (from the backend/ directory):
+
+    python check_ann.py                                  # all domains, default knobs
+    python check_ann.py manga --probes 1 4 16 --candidates 500 2000 --samples 500
+    python check_ann.py movie --min-recall 0.95          # gate a build
+
+For a reproducible random sample of items per domain, the top-N under the
+default weights is computed exactly (every item scored) and through the ANN
+index (only candidates scored, see ann_index.py) for every combination of
+``--probes`` and ``--candidates``. Reported per combination:
+
+* ``recall``: mean share of the exact top-N also in the approximate top-N
+* ``min_recall``: the worst sample's share
+* ``exact_ms`` / ``ann_ms``: mean time per item of each path
+
+Domains whose bundle has no ANN index get one built in memory first, with
+``--dim`` and ``--lists``, so settings can be evaluated before a build.
+"""
+import argparse
+import importlib
+import json
+import sys
+import time
+
+import numpy as np
+
+from ann_index import DEFAULT_CANDIDATES, DEFAULT_DIM, DEFAULT_PROBES, AnnIndex
+from domains import DOMAINS
+from ranking import top_n_indices
+
+DOMAIN_MODULES = {domain.bundle: domain.module for domain in DOMAINS.values()}
+
+
+def _exact(module, idx, top_n):
+    return top_n_indices(module.compute_scores(idx), top_n, exclude=idx)
+
+
+def _approximate(module, idx, top_n):
+    rows = module.candidate_rows(idx)
+    scores = module.compute_candidate_scores(idx, rows)
+    return rows[top_n_indices(scores, top_n, exclude=np.flatnonzero(rows == idx))]
+
+
+def check(name, probes, candidates, samples, top_n, dim, lists):
+    module = importlib.import_module(DOMAIN_MODULES[name])
+    if module.ann_index is None:
+        module.ann_index = AnnIndex.build(module.ann_features(), dim, lists)
+    ann_index = module.ann_index
+
+    n_items = len(module.tag_similarities)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(n_items, size=min(samples, n_items), replace=False)
+
+    start = time.perf_counter()
+    exact = [_exact(module, idx, top_n) for idx in sample]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+    report = {"n_items": n_items, "lists": ann_index.n_lists, "exact_ms": exact_ms, "settings": []}
+    for n_probes in probes:
+        for n_candidates in candidates:
+            ann_index.probes, ann_index.candidates = n_probes, n_candidates
+            start = time.perf_counter()
+            approximate = [_approximate(module, idx, top_n) for idx in sample]
+            ann_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+            recalls = [len(np.intersect1d(ref, rows)) / max(len(ref), 1) for ref, rows in zip(exact, approximate)]
+            report["settings"].append({
+                "probes": n_probes,
+                "candidates": n_candidates,
+                "recall": float(np.mean(recalls)),
+                "min_recall": float(np.min(recalls)),
+                "ann_ms": ann_ms,
+            })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("domains", nargs="*", metavar="domain",
+                        help=f"domains to check (default: all of {', '.join(DOMAIN_MODULES)})")
+    parser.add_argument("--probes", type=int, nargs="+", default=[DEFAULT_PROBES],
+                        help=f"inverted lists searched per query (default: {DEFAULT_PROBES})")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[DEFAULT_CANDIDATES],
+                        help=f"candidates re-scored per query (default: {DEFAULT_CANDIDATES})")
+    parser.add_argument("--samples", type=int, default=200, help="items sampled per domain (default: 200)")
+    parser.add_argument("--top-n", type=int, default=10, help="recommendations compared per item (default: 10)")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM,
+                        help=f"embedding dimensions if an index is built here (default: {DEFAULT_DIM})")
+    parser.add_argument("--lists", type=int, default=None,
+                        help="inverted lists if an index is built here (default: about sqrt of the catalog size)")
+    parser.add_argument("--min-recall", type=float, default=None,
+                        help="fail if any setting's mean recall is lower")
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.domains) - set(DOMAIN_MODULES))
+    if unknown:
+        parser.error(f"unknown domain(s): {', '.join(unknown)}")
+
+    failed = False
+    for name in args.domains or DOMAIN_MODULES:
+        report = check(name, args.probes, args.candidates, args.samples, args.top_n, args.dim, args.lists)
+        print(json.dumps({"domain": name, **report}))
+        if args.min_recall is not None:
+            failed |= any(setting["recall"] < args.min_recall for setting in report["settings"])
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
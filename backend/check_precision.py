@@ -0,0 +1,122 @@
+"""Check that compact score precisions rank like the float64 path.
+
+Usage (from the backend/ directory):
+
+    python check_precision.py                          # all domains, all precisions
+    python check_precision.py movie tv --precision uint8 --samples 500 --top-n 20
+
+For a reproducible random sample of items per domain, the top-N
+recommendations under the default weights are computed in float64 and then
+with each compact precision (see compact.py). Reported per precision:
+
+* ``overlap``: mean share of the float64 top-N also in the compact top-N
+* ``min_overlap``: the worst sample's share
+* ``same_order``: share of samples with an identical ranked list
+* ``max_score_error``: largest absolute difference of matching scores
+* ``static_bytes``: memory of the rating/popularity vectors
+
+Exits non-zero if the mean overlap of any precision falls below
+``--min-overlap``, so it can gate a build. tests/test_compact.py runs the
+same check on synthetic catalogs.
+"""
+import argparse
+import importlib
+import json
+import sys
+
+import numpy as np
+
+from compact import PRECISIONS, STATIC_VECTORS, apply_precision
+from domains import DOMAINS
+from ranking import top_n_batch
+
+DOMAIN_MODULES = {domain.bundle: domain.module for domain in DOMAINS.values()}
+
+
+def _rankings(module, sample, top_n):
+    selections = top_n_batch(module.compute_scores_batch, sample, top_n, len(module.tag_similarities))
+    return [selections[int(idx)] for idx in sample]
+
+
+def _state(module):
+    """What apply_precision replaces, so each precision starts from float64."""
+    state = {name: getattr(module, name) for name in STATIC_VECTORS if hasattr(module, name)}
+    state["matrix"] = module.tag_similarities.matrix
+    state["boosts"] = dict(getattr(module, "CONTENT_BOOST", {}))
+    return state
+
+
+def _restore(module, state):
+    for name in STATIC_VECTORS:
+        if name in state:
+            setattr(module, name, state[name])
+    module.tag_similarities.matrix = state["matrix"]
+    module.tag_similarities.clear_cache()
+    module.genre_index.dtype = np.float64
+    if hasattr(module, "CONTENT_BOOST"):
+        module.CONTENT_BOOST.update(state["boosts"])
+
+
+def check(name, precisions, samples, top_n):
+    module = importlib.import_module(DOMAIN_MODULES[name])
+    n_items = len(module.tag_similarities)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(n_items, size=min(samples, n_items), replace=False)
+
+    state = _state(module)
+    reference = _rankings(module, sample, top_n)
+
+    report = {}
+    for precision in precisions:
+        apply_precision(module, precision)
+        compact = _rankings(module, sample, top_n)
+
+        overlaps, same_order, score_error = [], 0, 0.0
+        for (ref_rows, ref_scores), (rows, scores) in zip(reference, compact):
+            overlaps.append(len(np.intersect1d(ref_rows, rows)) / max(len(ref_rows), 1))
+            same_order += bool(np.array_equal(ref_rows, rows))
+            common, ref_pos, pos = np.intersect1d(ref_rows, rows, return_indices=True)
+            if len(common):
+                score_error = max(score_error, float(np.max(np.abs(ref_scores[ref_pos] - scores[pos]))))
+
+        report[precision] = {
+            "overlap": float(np.mean(overlaps)),
+            "min_overlap": float(np.min(overlaps)),
+            "same_order": same_order / len(sample),
+            "max_score_error": score_error,
+            "static_bytes": int(sum(getattr(module, v).nbytes for v in STATIC_VECTORS if hasattr(module, v))),
+        }
+        _restore(module, state)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("domains", nargs="*", metavar="domain",
+                        help=f"domains to check (default: all of {', '.join(DOMAIN_MODULES)})")
+    parser.add_argument("--precision", nargs="+", default=[p for p in PRECISIONS if p != "float64"],
+                        help="compact precisions to compare against float64")
+    parser.add_argument("--samples", type=int, default=200, help="items sampled per domain (default: 200)")
+    parser.add_argument("--top-n", type=int, default=10, help="recommendations compared per item (default: 10)")
+    parser.add_argument("--min-overlap", type=float, default=0.9,
+                        help="fail if a precision's mean overlap is lower (default: 0.9)")
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.domains) - set(DOMAIN_MODULES))
+    if unknown:
+        parser.error(f"unknown domain(s): {', '.join(unknown)}")
+    bad = sorted(set(args.precision) - set(PRECISIONS))
+    if bad:
+        parser.error(f"unknown precision(s): {', '.join(bad)}")
+
+    failed = False
+    for name in args.domains or DOMAIN_MODULES:
+        report = check(name, args.precision, args.samples, args.top_n)
+        print(json.dumps({"domain": name, **report}))
+        failed |= any(result["overlap"] < args.min_overlap for result in report.values())
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Compact scoring precision for the recommenders.
+
+Rankings do not need double precision, and every request streams the whole
+catalog's score inputs through memory. With ``SCORE_PRECISION`` set, a
+domain's scoring arrays are converted once when it is loaded:
+
+* ``float32``: TF-IDF values, genre similarities, the rating and popularity
+  vectors and the series content boosts are stored and computed as float32.
+* ``int16`` / ``uint8``: as float32, but the static rating and popularity
+  vectors are additionally quantised to 15 / 8 bit codes with a per-vector
+  scale and offset, dequantised on the fly when weighted.
+
+``float64`` (the default) keeps the arrays as loaded. check_precision.py
+measures how well the compact rankings agree with the float64 ones.
+"""
+import os
+from types import ModuleType
+
+import numpy as np
+
+PRECISION_ENV = "SCORE_PRECISION"
+PRECISIONS = ("float64", "float32", "int16", "uint8")
+
+# Module-level per-item vectors that only ever get weighted and summed
+STATIC_VECTORS = ("normalized_ratings", "normalized_popularity", "combined_popularity")
+
+_CODE_MAX = {"int16": np.iinfo(np.int16).max, "uint8": np.iinfo(np.uint8).max}
+
+
+class QuantizedVector:
+    """A float vector stored as integer codes: ``value = offset + scale * code``.
+
+    Supports what the recommenders do with their static vectors, multiplying
+    by a weight or indexing, which yield float32 arrays; ``np.asarray``
+    dequantises it.
+    """
+
+    def __init__(self, values, code_dtype: str):
+        values = np.asarray(values, dtype=np.float64)
+        code_max = _CODE_MAX[code_dtype]
+        low = float(values.min()) if values.size else 0.0
+        span = float(values.max()) - low if values.size else 0.0
+
+        self.offset = low
+        self.scale = span / code_max if span > 0 else 1.0
+        self.codes = np.rint((values - low) / self.scale).astype(code_dtype)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def __mul__(self, weight):
+        scaled = np.multiply(self.codes, np.float32(weight * self.scale), dtype=np.float32)
+        scaled += np.float32(weight * self.offset)
+        return scaled
+
+    __rmul__ = __mul__
+
+    def __getitem__(self, idx):
+        """Dequantised float32 values at `idx`, without decoding the whole vector."""
+        values = np.multiply(self.codes[idx], np.float32(self.scale), dtype=np.float32)
+        values += np.float32(self.offset)
+        return values
+
+    def __array__(self, dtype=None, copy=None):
+        values = self * 1.0
+        return values if dtype is None else values.astype(dtype)
+
+
+def precision_from_env() -> str:
+    precision = os.environ.get(PRECISION_ENV, "float64").strip().lower() or "float64"
+    if precision not in PRECISIONS:
+        raise ValueError(f"{PRECISION_ENV} must be one of {', '.join(PRECISIONS)}, not '{precision}'")
+    return precision
+
+
+def apply_precision(module: ModuleType, precision: str) -> None:
+    """Convert a loaded recommender `module`'s scoring arrays to `precision` in place."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown score precision: {precision}")
+    if precision == "float64":
+        return
+
+    module.tag_similarities.astype(np.float32)
+    if hasattr(module, "query_index"):
+        module.query_index.astype(np.float32)
+    module.genre_index.dtype = np.float32
+
+    for name in STATIC_VECTORS:
+        if hasattr(module, name):
+            values = getattr(module, name)
+            if precision == "float32":
+                setattr(module, name, np.asarray(values, dtype=np.float32))
+            else:
+                setattr(module, name, QuantizedVector(values, precision))
+
+    boosts = getattr(module, "CONTENT_BOOST", None)
+    if boosts is not None:
+        for genre in boosts:
+            boosts[genre] = boosts[genre].astype(np.float32)
@@ -0,0 +1,138 @@
+"""One embedding space shared by every domain's catalog, for cross-domain recommendations.
+
+Each domain has its own TF-IDF vocabulary, so a movie's tag row cannot be
+compared with an anime's. ``build_cross_index`` fits a single vectorizer on
+the tag and genre words of all catalogs together, reduces the result to a
+few dozen dimensions with TruncatedSVD and stores the L2-normalised
+embeddings of every item as one contiguous matrix, domain after domain, with
+each domain's row range recorded in the metadata. Alongside it sits each
+item's quality, its domain's rating and popularity blend scaled to [0, 1].
+
+A cross-domain request scores the row ranges of all its target domains with
+one matrix-vector product against the source item's embedding and selects
+the top-N of each range separately.
+
+Files live next to the model bundles like the top-K tables (see
+topk_index.py) and are memory-mapped at load; they are only used while the
+loaded bundles are the ones they were built from.
+"""
+import json
+import os
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ranking import top_n_indices
+from topk_index import INDEX_DIR
+
+DEFAULT_DIM = 128
+
+# Weights of embedding similarity and item quality in cross-domain scores
+DEFAULT_CROSS_WEIGHTS = (0.8, 0.2)
+
+
+def _paths(index_dir: str = INDEX_DIR) -> Tuple[str, str, str]:
+    base = os.path.join(index_dir, "cross")
+    return f"{base}_embeddings.npy", f"{base}_quality.npy", f"{base}_meta.json"
+
+
+class CrossIndex:
+    """Item embeddings of several domains in one matrix (see the module docstring)."""
+
+    def __init__(self, embeddings: np.ndarray, quality: np.ndarray, ranges: Mapping[str, Tuple[int, int]]):
+        self.embeddings = embeddings
+        self.quality = quality
+        # Bundle name -> [start, end) of its rows
+        self.ranges = {name: (int(start), int(end)) for name, (start, end) in ranges.items()}
+
+    def covers(self, name: str) -> bool:
+        return name in self.ranges
+
+    def recommend(self, source: str, idx: int, targets: Sequence[str], top_n: int = 10,
+                  weights: Sequence[float] = DEFAULT_CROSS_WEIGHTS) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Best items of each target domain for item `idx` of domain `source`.
+
+        Returns target -> (rows, scores), rows being positions in that
+        domain's own catalog, best first. The source item itself is excluded
+        when `source` is among the targets.
+        """
+        similarity, quality = weights
+        query = self.embeddings[self.ranges[source][0] + int(idx)]
+
+        # Targets are scored together over the span of rows covering all of them
+        lo = min(self.ranges[target][0] for target in targets)
+        hi = max(self.ranges[target][1] for target in targets)
+        scores = similarity * (self.embeddings[lo:hi] @ query) + quality * self.quality[lo:hi]
+
+        results = {}
+        for target in targets:
+            start, end = self.ranges[target]
+            target_scores = scores[start - lo:end - lo]
+            rows = top_n_indices(target_scores, top_n, exclude=int(idx) if target == source else None)
+            results[target] = (rows, target_scores[rows])
+        return results
+
+
+def load_cross_index(versions: Mapping[str, str], index_dir: str = INDEX_DIR) -> Optional[CrossIndex]:
+    """Open the shared space if it was built from the bundles at `versions` (name -> bundle_version).
+
+    Returns None when it was not built or any of its domains has been rebuilt
+    since, in which case cross-domain requests cannot be answered.
+    """
+    embeddings_path, quality_path, meta_path = _paths(index_dir)
+    if not all(os.path.exists(p) for p in (embeddings_path, quality_path, meta_path)):
+        return None
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    domains = meta.get("domains", {})
+    if any(domains.get(name, {}).get("version") != version for name, version in versions.items()):
+        return None
+
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    quality = np.load(quality_path, mmap_mode="r")
+    ranges = {name: (entry["start"], entry["end"]) for name, entry in domains.items()}
+    if embeddings.shape[0] != quality.shape[0] or max(end for _, end in ranges.values()) > embeddings.shape[0]:
+        return None
+    return CrossIndex(embeddings, quality, ranges)
+
+
+def build_cross_index(features: Mapping[str, Tuple[Sequence[str], np.ndarray]], versions: Mapping[str, str],
+                      dim: int = DEFAULT_DIM, seed: int = 0, index_dir: str = INDEX_DIR) -> str:
+    """Embed the catalogs in `features` (name -> (texts, quality)) into one space and write it to disk.
+
+    `texts` are each item's tag and genre words and `quality` its rating and
+    popularity blend in [0, 1]. Written through temporary files and renamed
+    into place like the top-K tables. Deterministic for a given `seed`.
+    """
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    names = list(features)
+    texts = [text for name in names for text in features[name][0]]
+    quality = np.concatenate([np.asarray(features[name][1], dtype=np.float32) for name in names])
+
+    # One vocabulary over every catalog, so shared words land on shared dimensions
+    matrix = TfidfVectorizer(min_df=2, sublinear_tf=True).fit_transform(texts)
+    dim = max(1, min(dim, matrix.shape[1] - 1, matrix.shape[0] - 1))
+    embeddings = TruncatedSVD(n_components=dim, random_state=seed).fit_transform(matrix)
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms > 0).astype(np.float32)
+
+    domains, start = {}, 0
+    for name in names:
+        end = start + len(features[name][0])
+        domains[name] = {"start": start, "end": end, "version": versions[name]}
+        start = end
+
+    embeddings_path, quality_path, meta_path = _paths(index_dir)
+    for path, array in ((embeddings_path, embeddings), (quality_path, quality)):
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(path + ".tmp", path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"dim": dim, "domains": domains}, f)
+
+    return embeddings_path
@@ -0,0 +1,222 @@
+import importlib
+import os
+import threading
+import time
+from types import ModuleType
+from typing import Dict, Iterable, NamedTuple, Optional, Sequence
+
+import model_loader
+from compact import apply_precision, precision_from_env
+from cross_index import DEFAULT_CROSS_WEIGHTS, load_cross_index
+from filters import NO_FILTERS, Filters
+from metrics import DOMAIN_LOAD_SECONDS, stage, stage_timer
+from pagination import Cursor, StaleCursor, depth_from_env, ranking_cache_from_env
+from result_cache import cache_from_env, cache_key
+
+
+class Domain(NamedTuple):
+    """Where a recommendation domain's code and data live."""
+
+    bundle: str     # logical bundle name understood by model_loader.get_bundle
+    module: str     # recommender module that loads the bundle on import
+    recommend: str  # single-title recommender function
+    batch: str      # many-title recommender function
+    profile: str    # multi-seed profile recommender function
+    search: str     # free-text query recommender function
+    rank: str       # ranked rows and scores for one catalog item
+
+
+# URL segment -> domain
+DOMAINS: Dict[str, Domain] = {
+    "movies": Domain("movie", "movie_recommend", "recommend_movies_advanced",
+                     "recommend_movies_batch", "recommend_movies_profile", "search_movies", "rank_movies"),
+    "anime": Domain("anime", "anime_recommend", "recommend_anime_advanced",
+                    "recommend_anime_batch", "recommend_anime_profile", "search_anime", "rank_anime"),
+    "manga": Domain("manga", "manga_recommend", "recommend_manga_advanced",
+                    "recommend_manga_batch", "recommend_manga_profile", "search_manga", "rank_manga"),
+    "series": Domain("tv", "series_recommend", "recommend_tv_series",
+                     "recommend_tv_series_batch", "recommend_tv_series_profile", "search_tv_series", "rank_tv_series"),
+}
+
+# Comma-separated domains (or "all") to load at startup instead of on first request
+PRELOAD_ENV = "PRELOAD_DOMAINS"
+
+_MODULES: Dict[str, ModuleType] = {}
+_LOCKS: Dict[str, threading.Lock] = {name: threading.Lock() for name in DOMAINS}
+
+_CROSS_LOCK = threading.Lock()
+_cross_index = None
+
+# Times the cross-domain pipeline stages (see metrics.py)
+cross_stage = stage_timer("cross")
+
+# Finished single-title results (see result_cache.py for the RESULT_CACHE_* settings)
+result_cache = cache_from_env()
+
+# Ranked rows and scores behind paged requests (see pagination.py)
+ranking_cache = ranking_cache_from_env()
+PAGINATION_DEPTH = depth_from_env()
+
+
+def load_domain(name: str) -> ModuleType:
+    """Import the recommender module for `name`, loading its bundle on first use.
+
+    Each domain has its own lock, so a slow first load of one domain does not
+    hold up requests for domains that are already loaded.
+    """
+    if name not in DOMAINS:
+        raise KeyError(f"Unknown domain: {name}")
+
+    module = _MODULES.get(name)
+    if module is not None:
+        return module
+
+    with _LOCKS[name]:
+        if name not in _MODULES:
+            start = time.perf_counter()
+            module = importlib.import_module(DOMAINS[name].module)
+            apply_precision(module, precision_from_env())
+            DOMAIN_LOAD_SECONDS.observe(time.perf_counter() - start, domain=name)
+            _MODULES[name] = module
+        return _MODULES[name]
+
+
+def get_function(name: str, kind: str):
+    """The `kind` ("recommend", "batch", "profile", "search" or "rank") function of domain `name`."""
+    return getattr(load_domain(name), getattr(DOMAINS[name], kind))
+
+
+def recommend_key(name: str, title: str, top_n: int = 10, weights: Optional[Sequence[float]] = None,
+                  filters: Optional[Filters] = None) -> str:
+    """Result cache key of a single-title request; `weights` default to the domain's own."""
+    if weights is None:
+        weights = load_domain(name).DEFAULT_WEIGHTS
+    filters_key = filters.key() if filters is not None and filters.active else None
+    return cache_key(name, title, top_n, weights, model_loader.bundle_version(DOMAINS[name].bundle), filters_key)
+
+
+def recommend(name: str, title: str, top_n: int = 10, weights: Optional[Sequence[float]] = None,
+              filters: Optional[Filters] = None):
+    """Single-title recommendations of domain `name`, answered from the result cache when possible.
+
+    Not-found errors are cached too, so repeated misses skip fuzzy matching.
+    """
+    key = recommend_key(name, title, top_n, weights, filters)
+    result = result_cache.get(key)
+    if result is None:
+        options = {}
+        if weights is not None:
+            options["weights"] = weights
+        if filters is not None and filters.active:
+            options["filters"] = filters
+        result = get_function(name, "recommend")(title, top_n=top_n, **options)
+        result_cache.put(key, result)
+    return result
+
+
+def _ranking(name: str, title: str, filters: Filters, version: str):
+    """Ranked (rows, scores) of `title` in domain `name`, or None if it is not in the catalog."""
+    key = cache_key(name, title, PAGINATION_DEPTH, load_domain(name).DEFAULT_WEIGHTS, version,
+                    filters.key() if filters.active else None)
+    ranking = ranking_cache.get(key)
+    if ranking is None:
+        module = load_domain(name)
+        input_idx = module.resolve_title(title)
+        if input_idx is None:
+            return None
+        ranking = get_function(name, "rank")(input_idx, PAGINATION_DEPTH, mask=module.filter_mask(filters))
+        ranking_cache.put(key, ranking)
+    return ranking
+
+
+def recommend_page(name: str, title: Optional[str] = None, limit: Optional[int] = None,
+                   filters: Filters = NO_FILTERS, cursor: Optional[str] = None):
+    """A page of single-title recommendations of domain `name` and the cursor of the next one.
+
+    The first page is asked for by `title`, `limit` (default 10) and
+    `filters`; later ones by the `cursor` returned with the previous page
+    (`limit` may change the page size from there on). Returns ``{"recommendations": [...],
+    "next_cursor": str or None}`` or an error dict if the title is not in the
+    catalog. Raises ValueError for a malformed cursor or one of another
+    domain, and StaleCursor if the bundle was rebuilt since it was issued.
+    """
+    version = model_loader.bundle_version(DOMAINS[name].bundle)
+    if cursor is None:
+        position = Cursor(name, version, title, filters, 0, 10 if limit is None else limit)
+    else:
+        position = Cursor.decode(cursor)
+        if position.domain != name:
+            raise ValueError("Invalid cursor")
+        if position.version != version:
+            raise StaleCursor("The recommendations have changed since this cursor was issued; start over.")
+        if limit is not None:
+            position = position._replace(limit=limit)
+
+    ranking = _ranking(name, position.title, position.filters, version)
+    if ranking is None:
+        return {"error": f"Title '{position.title}' not found in the {name} dataset."}
+
+    rows, scores = ranking
+    end = position.offset + position.limit
+    with stage(DOMAINS[name].bundle, "serialise"):
+        records = load_domain(name).build_records(rows[position.offset:end], scores[position.offset:end])
+    following = position.next(len(rows))
+    return {"recommendations": records, "next_cursor": None if following is None else following.encode()}
+
+
+def cross_index():
+    """The space shared by all domains (see cross_index.py), or None if it was not built from the loaded bundles.
+
+    Loads every domain on first use, since the space covers all of them.
+    """
+    global _cross_index
+    if _cross_index is None:
+        with _CROSS_LOCK:
+            if _cross_index is None:
+                preload(DOMAINS)
+                versions = {domain.bundle: model_loader.bundle_version(domain.bundle) for domain in DOMAINS.values()}
+                _cross_index = load_cross_index(versions) or False
+    return _cross_index or None
+
+
+def recommend_cross(source: str, title: str, targets: Sequence[str], top_n: int = 10,
+                    weights: Sequence[float] = DEFAULT_CROSS_WEIGHTS):
+    """Recommendations in each of the `targets` domains for `title` of domain `source`.
+
+    Returns target -> records, or an error dict if the title is not in the
+    source catalog. Raises LookupError if the shared space was not built.
+    """
+    index = cross_index()
+    if index is None:
+        raise LookupError("The cross-domain index was not built for the loaded bundles; run build_cross_index.py.")
+
+    input_idx = load_domain(source).resolve_title(title)
+    if input_idx is None:
+        return {"error": f"Title '{title}' not found in the {source} dataset."}
+
+    bundles = {target: DOMAINS[target].bundle for target in targets}
+    with cross_stage("tag_sim"):
+        selections = index.recommend(DOMAINS[source].bundle, input_idx, list(bundles.values()), top_n, weights)
+    with cross_stage("serialise"):
+        return {target: load_domain(target).build_records(*selections[bundle]) for target, bundle in bundles.items()}
+
+
+def is_loaded(name: str) -> bool:
+    return name in _MODULES
+
+
+def preload(names: Optional[Iterable[str]] = None) -> None:
+    """Load the given domains now; defaults to the PRELOAD_DOMAINS environment variable."""
+    if names is None:
+        configured = os.environ.get(PRELOAD_ENV, "").strip()
+        if configured.lower() == "all":
+            names = list(DOMAINS)
+        else:
+            names = [n.strip() for n in configured.split(",") if n.strip()]
+
+    # Fetch missing bundles in parallel before the (CPU-bound) loads
+    names = list(names)
+    model_loader.prefetch(DOMAINS[name].bundle for name in names)
+
+    for name in names:
+        load_domain(name)
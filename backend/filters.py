@@ -0,0 +1,231 @@
+"""Request-level filters on recommendation results, evaluated as precomputed bitmaps.
+
+A ``Filters`` value describes which items a client wants back: any of some
+genres, none of others, rating and popularity floors, titles to leave out
+(e.g. already watched) and, for TV series, each genre's own ``min_rating``
+from GENRE_SETTINGS. Each recommender's ``FilterIndex`` turns it into a
+boolean mask over the catalog, which the recommenders apply before top-N
+selection (see ``ranking.top_n_indices``), so a filtered request still
+returns a full page whenever enough items pass.
+
+The mask is assembled from bitmaps (one bit per item, packed eight to a
+byte) built once at load:
+
+* one per genre
+* one per bucket edge of ``average_rating`` and of popularity, holding
+  the items at or above that edge; a floor between two edges starts from the
+  lower edge's bitmap and clears the few items sorted below the floor
+* for TV series, the items meeting their primary genre's ``min_rating``
+
+so evaluating filters costs a handful of bitwise operations on N/8 bytes.
+
+Popularity is the normalised vector each recommender already scores with
+(``normalized_popularity``, or ``combined_popularity`` for anime), so
+``min_popularity`` is a floor on the same [0, 1] scale in every domain.
+"""
+from typing import Any, FrozenSet, Iterable, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Query parameters read by ``filters_from_args``
+FILTER_PARAMS = ("genres", "exclude_genres", "min_rating", "min_popularity", "exclude", "genre_min_rating")
+
+# Rating and popularity bitmaps: one per quantile edge
+DEFAULT_BUCKETS = 32
+
+# At most this many titles may be excluded per request
+MAX_EXCLUDED = 1000
+
+
+class Filters(NamedTuple):
+    """What a client wants back; the defaults keep every item."""
+
+    genres: FrozenSet[str] = frozenset()          # keep items with any of these genres
+    exclude_genres: FrozenSet[str] = frozenset()  # drop items with any of these genres
+    min_rating: Optional[float] = None            # average_rating floor
+    min_popularity: Optional[float] = None        # normalised popularity floor, 0 to 1
+    exclude: Tuple[str, ...] = ()                 # titles to leave out, e.g. already watched
+    genre_min_rating: bool = False                # apply GENRE_SETTINGS min_rating (TV series)
+
+    @property
+    def active(self) -> bool:
+        return self != NO_FILTERS
+
+    def key(self) -> list:
+        """JSON-serialisable form for cache keys; the same for equivalent filters."""
+        return [sorted(self.genres), sorted(self.exclude_genres), self.min_rating, self.min_popularity,
+                sorted(set(self.exclude)), self.genre_min_rating]
+
+
+NO_FILTERS = Filters()
+
+
+def _genres(value: Any, name: str) -> FrozenSet[str]:
+    if value is None:
+        return frozenset()
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, (list, tuple)) or not all(isinstance(g, str) for g in value):
+        raise ValueError(f"'{name}' must be a list of genres or a comma-separated string")
+    return frozenset(g.strip().lower() for g in value if g.strip())
+
+
+def _floor(value: Any, name: str) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"'{name}' must be a number")
+    try:
+        floor = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be a number") from None
+    if not np.isfinite(floor):
+        raise ValueError(f"'{name}' must be finite")
+    return floor
+
+
+def _flag(value: Any, name: str) -> bool:
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ("1", "true", "yes", "0", "false", "no", ""):
+        return value.strip().lower() in ("1", "true", "yes")
+    raise ValueError(f"'{name}' must be true or false")
+
+
+def parse_filters(values: Optional[Mapping[str, Any]]) -> Filters:
+    """Filters from a JSON object such as a request body's ``"filters"``; raises ValueError if malformed."""
+    if values is None:
+        return NO_FILTERS
+    if not isinstance(values, Mapping):
+        raise ValueError("'filters' must be an object")
+
+    unknown = sorted(set(values) - set(FILTER_PARAMS))
+    if unknown:
+        raise ValueError(f"unknown filter(s): {', '.join(unknown)}")
+
+    exclude = values.get("exclude") or []
+    if not isinstance(exclude, (list, tuple)) or not all(isinstance(t, str) for t in exclude):
+        raise ValueError("'exclude' must be a list of titles")
+    if len(exclude) > MAX_EXCLUDED:
+        raise ValueError(f"at most {MAX_EXCLUDED} titles may be excluded")
+
+    return Filters(
+        genres=_genres(values.get("genres"), "genres"),
+        exclude_genres=_genres(values.get("exclude_genres"), "exclude_genres"),
+        min_rating=_floor(values.get("min_rating"), "min_rating"),
+        min_popularity=_floor(values.get("min_popularity"), "min_popularity"),
+        exclude=tuple(t for t in exclude if t),
+        genre_min_rating=_flag(values.get("genre_min_rating"), "genre_min_rating"),
+    )
+
+
+def filters_from_args(args) -> Filters:
+    """Filters from query parameters (a werkzeug MultiDict); ``exclude`` may be repeated."""
+    values = {name: args.get(name) for name in FILTER_PARAMS if name in args and name != "exclude"}
+    if "exclude" in args:
+        values["exclude"] = args.getlist("exclude")
+    return parse_filters(values)
+
+
+def _pack(mask: np.ndarray) -> np.ndarray:
+    return np.packbits(mask, axis=-1)
+
+
+class ColumnFloors:
+    """Bitmaps of the items whose value is at or above each quantile edge of a column."""
+
+    def __init__(self, values: np.ndarray, buckets: int):
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+
+        # Ascending, missing values last: they never pass a floor
+        self.order = np.argsort(np.where(valid, values, np.inf), kind="stable").astype(np.intp)
+        self.sorted = values[self.order][:int(valid.sum())]
+
+        if self.sorted.size:
+            self.edges = np.unique(np.quantile(self.sorted, np.linspace(0, 1, buckets, endpoint=False)))
+        else:
+            self.edges = np.empty(0)
+        self.bits = _pack(values[None, :] >= self.edges[:, None]) if self.edges.size else np.empty((0, 0), np.uint8)
+        self.valid_bits = _pack(valid)
+
+    def at_least(self, floor: float) -> np.ndarray:
+        """Packed bitmap of the items whose value is >= `floor`."""
+        i = int(np.searchsorted(self.edges, floor, side="right")) - 1
+        if i < 0:
+            bits, start = self.valid_bits.copy(), 0
+        else:
+            bits = self.bits[i].copy()
+            start = int(np.searchsorted(self.sorted, self.edges[i], side="left"))
+
+        # Items between the edge and the floor are in the edge's bitmap but below the floor
+        below = self.order[start:int(np.searchsorted(self.sorted, floor, side="left"))]
+        if below.size:
+            np.bitwise_and.at(bits, below >> 3, ~(np.uint8(0x80) >> (below & 7).astype(np.uint8)))
+        return bits
+
+
+class FilterIndex:
+    """Bitmaps of one catalog for evaluating ``Filters`` (see the module docstring).
+
+    `genre_index` supplies the genre sets, `popularity` is the catalog's
+    normalised popularity vector, `titles` (a TitleIndex) resolves
+    excluded titles by exact normalised match (every row of a duplicated
+    title), and `row_min_rating`, if given, is each item's own rating floor
+    for ``genre_min_rating``.
+    """
+
+    def __init__(self, genre_index, ratings: pd.Series, popularity: np.ndarray, titles,
+                 row_min_rating: Optional[np.ndarray] = None, buckets: int = DEFAULT_BUCKETS):
+        self.n = len(ratings)
+        self.titles = titles
+        self.genre_ids = dict(genre_index.vocab)
+
+        # One row of bits per genre: the items of every genre combination containing it
+        members = genre_index.multi_hot[genre_index.row_combo].astype(bool) & genre_index.valid[:, None]
+        self.genre_bits = _pack(np.ascontiguousarray(members.T))
+
+        ratings = pd.to_numeric(ratings, errors="coerce").to_numpy(dtype=np.float64)
+        self.rating_floors = ColumnFloors(ratings, buckets)
+        self.popularity_floors = ColumnFloors(np.asarray(popularity, dtype=np.float64), buckets)
+        self.own_floor_bits = None if row_min_rating is None else _pack(ratings >= row_min_rating)
+
+    def _any_genre(self, genres: Iterable[str]) -> np.ndarray:
+        ids = [self.genre_ids[g] for g in genres if g in self.genre_ids]
+        if not ids:
+            return np.zeros(self.genre_bits.shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(self.genre_bits[ids], axis=0)
+
+    def validate(self, filters: Filters) -> Filters:
+        """`filters`, or ValueError if they ask for a filter this catalog does not have."""
+        if filters.genre_min_rating and self.own_floor_bits is None:
+            raise ValueError("'genre_min_rating' is not available for this catalog")
+        return filters
+
+    def mask(self, filters: Optional[Filters]) -> Optional[np.ndarray]:
+        """Boolean mask of the items passing `filters`, or None if they keep every item."""
+        if filters is None or not filters.active:
+            return None
+        self.validate(filters)
+
+        parts = []
+        if filters.genres:
+            parts.append(self._any_genre(filters.genres))
+        if filters.exclude_genres:
+            parts.append(~self._any_genre(filters.exclude_genres))
+        if filters.min_rating is not None:
+            parts.append(self.rating_floors.at_least(filters.min_rating))
+        if filters.min_popularity is not None:
+            parts.append(self.popularity_floors.at_least(filters.min_popularity))
+        if filters.genre_min_rating:
+            parts.append(self.own_floor_bits)
+
+        if parts:
+            mask = np.unpackbits(np.bitwise_and.reduce(parts, axis=0), count=self.n).view(bool)
+        else:
+            mask = np.ones(self.n, dtype=bool)
+
+        for title in filters.exclude:
+            mask[list(self.titles.rows(title))] = False
+        return mask
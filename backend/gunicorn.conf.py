@@ -0,0 +1,20 @@
+"""Gunicorn settings for pre-fork serving of the unified API.
+
+Run from the backend/ directory:
+
+    gunicorn -c gunicorn.conf.py
+
+The master builds the app through ``unified_app.create_prefork_app()``, which
+loads every domain and freezes it (see prefork.py) before any worker is
+forked, so the workers share the loaded bundles copy-on-write instead of each
+loading its own copy. ``GET /debug/memory`` reports the answering worker's
+shared vs private memory.
+"""
+import os
+
+wsgi_app = "unified_app:create_prefork_app()"
+preload_app = True
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+timeout = 120
@@ -0,0 +1,131 @@
+"""Latency metrics for the recommendation pipeline in Prometheus text format.
+
+Recommenders time their stages with ``stage(domain, name)`` (see
+``stage_timer``). Outside a request each timing is observed right away; inside
+one (between ``start_request`` and ``finish_request``, which unified_app calls
+around every request) timings are summed per stage first, so a stage that runs
+several times for one request (e.g. once per batch chunk) counts as one
+observation, and the breakdown can be returned to the client.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Seconds; fine-grained at the low end where most stages fall
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LOAD_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Pipeline stages, in order
+STAGES = ("lookup", "filter", "ann", "genre_sim", "tag_sim", "combine", "select", "serialise")
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 buckets: Sequence[float] = STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            # Per bucket counts, then sum and count
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            labels = ",".join(f'{name}="{value}"' for name, value in zip(self.labelnames, key))
+            sep = "," if labels else ""
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {count:g}')
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {values[-1]:g}')
+            lines.append(f"{self.name}_sum{{{labels}}} {values[-2]:.9g}")
+            lines.append(f"{self.name}_count{{{labels}}} {values[-1]:g}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("unirex_stage_seconds", "Time spent per recommendation pipeline stage.",
+                          ("domain", "stage"))
+BUNDLE_LOAD_SECONDS = Histogram("unirex_bundle_load_seconds", "Time to load a model bundle from disk.",
+                                ("bundle",), LOAD_BUCKETS)
+DOMAIN_LOAD_SECONDS = Histogram("unirex_domain_load_seconds",
+                                "Time to load a recommender, bundle load and precomputation included.",
+                                ("domain",), LOAD_BUCKETS)
+REQUEST_SECONDS = Histogram("unirex_request_seconds", "Time to answer an API request.",
+                            ("endpoint", "status"))
+
+_HISTOGRAMS = [STAGE_SECONDS, BUNDLE_LOAD_SECONDS, DOMAIN_LOAD_SECONDS, REQUEST_SECONDS]
+
+# Callables returning extra exposition lines (e.g. result cache counters)
+_COLLECTORS: List[Callable[[], Iterable[str]]] = []
+
+_local = threading.local()
+
+
+@contextmanager
+def stage(domain: str, name: str):
+    """Time the enclosed block as stage `name` of `domain`'s pipeline."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings = getattr(_local, "timings", None)
+        if timings is None:
+            STAGE_SECONDS.observe(elapsed, domain=domain, stage=name)
+        else:
+            timings[(domain, name)] = timings.get((domain, name), 0.0) + elapsed
+
+
+def stage_timer(domain: str):
+    """``stage`` bound to `domain`, for use as ``with stage("lookup"): ...``."""
+    return partial(stage, domain)
+
+
+def start_request() -> None:
+    _local.timings = {}
+
+
+def finish_request() -> Dict[Tuple[str, str], float]:
+    """Observe and return the stage totals of the current request."""
+    timings = getattr(_local, "timings", None) or {}
+    _local.timings = None
+    for (domain, name), seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, domain=domain, stage=name)
+    return timings
+
+
+def server_timing(timings: Dict[Tuple[str, str], float]) -> str:
+    """``Server-Timing`` header value for a request's stage totals, in milliseconds."""
+    order = {name: i for i, name in enumerate(STAGES)}
+    entries = sorted(timings.items(), key=lambda item: (item[0][0], order.get(item[0][1], len(order))))
+    return ", ".join(f"{name};dur={seconds * 1000:.3f};desc=\"{domain}\"" for (domain, name), seconds in entries)
+
+
+def register_collector(collector: Callable[[], Iterable[str]]) -> None:
+    _COLLECTORS.append(collector)
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for histogram in _HISTOGRAMS:
+        lines.extend(histogram.render())
+    for collector in _COLLECTORS:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
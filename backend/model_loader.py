@@ -1,10 +1,22 @@
+import hashlib
+import json
 import os
 import pickle
 import threading
-from typing import Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
 
 import requests
 
+from bundle_format import is_artifact, load_artifact, read_meta
+from metrics import BUNDLE_LOAD_SECONDS
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process download lock
+    fcntl = None
+
 # Mapping from logical model name to GitHub Releases asset URL
 MODEL_URLS: Dict[str, str] = {
     "anime": "https://github.com/Karthik7939/UNIREX/releases/download/v1.0.0/anime_recommender_bundle.pkl",
@@ -21,52 +33,323 @@ MODEL_FILENAMES: Dict[str, str] = {
     "tv": "tv_series_recommender_bundle.pkl",
 }
 
+BACKEND_DIR = os.path.dirname(__file__)
+
+# Where bundles come from: unset for GitHub Releases, or a base URL / local directory
+SOURCE_ENV = "BUNDLE_SOURCE"
+
+# Optional {filename: sha256} manifest that downloaded and local bundles must match
+MANIFEST_ENV = "BUNDLE_MANIFEST"
+DEFAULT_MANIFEST = os.path.join(BACKEND_DIR, "bundle_manifest.json")
+
+FETCH_TIMEOUT = (10, 60)  # seconds to connect / between received bytes
+FETCH_RETRIES = 3
+CHUNK_SIZE = 1024 * 1024  # 1MB chunks
+
 # Cache for already loaded bundles (to avoid re-reading from disk)
 _BUNDLES: Dict[str, Dict[str, Any]] = {}
-_LOCK = threading.Lock()
+
+# Version of the data each loaded bundle came from (see bundle_version)
+_VERSIONS: Dict[str, str] = {}
+
+# One lock per bundle, so loading one domain never waits on another
+_LOAD_LOCKS: Dict[str, threading.Lock] = {name: threading.Lock() for name in MODEL_FILENAMES}
+_FETCH_LOCKS: Dict[str, threading.Lock] = {name: threading.Lock() for name in MODEL_FILENAMES}
+
+# Local files already checked against the manifest in this process
+_VERIFIED: set = set()
+
+# SHA-256 of bundle files hashed for their version, by (path, size, mtime)
+_DIGESTS: Dict[Tuple[str, int, int], str] = {}
+
+
+class BundleFetchError(RuntimeError):
+    """A bundle could not be fetched or did not match its manifest checksum."""
+
+
+class HTTPSource:
+    """Bundles served over HTTP(S).
+
+    Without a `base_url` the GitHub Releases assets in MODEL_URLS are used;
+    with one, ``<base_url>/<filename>`` (e.g. a local ``python -m http.server``
+    stand-in). Interrupted downloads resume with a Range request when the
+    server supports it and start over otherwise.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, timeout=FETCH_TIMEOUT):
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.timeout = timeout
+
+    def url(self, name: str) -> str:
+        if self.base_url is None:
+            return MODEL_URLS[name]
+        return f"{self.base_url}/{MODEL_FILENAMES[name]}"
+
+    def open(self, name: str, offset: int) -> Tuple[Iterator[bytes], int]:
+        """Chunks of bundle `name` from `offset` on, and the offset they actually start at."""
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        resp = requests.get(self.url(name), stream=True, timeout=self.timeout, headers=headers)
+        if resp.status_code == 416:
+            # Partial file is no prefix of the asset (e.g. it changed); start over
+            resp.close()
+            return self.open(name, 0)
+        resp.raise_for_status()
+
+        start = offset if resp.status_code == 206 else 0
+        return _iter_response(resp), start
+
+
+class LocalDirSource:
+    """Bundles copied from a local directory (a mounted volume, or fixtures in tests)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def open(self, name: str, offset: int) -> Tuple[Iterator[bytes], int]:
+        path = os.path.join(self.directory, MODEL_FILENAMES[name])
+        start = offset if offset <= os.path.getsize(path) else 0
+        return _iter_file(path, start), start
+
+
+def _iter_response(resp) -> Iterator[bytes]:
+    with resp:
+        for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+            if chunk:
+                yield chunk
+
+
+def _iter_file(path: str, start: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            yield chunk
+
+
+def get_source():
+    """The bundle source configured by BUNDLE_SOURCE (GitHub Releases when unset)."""
+    configured = os.environ.get(SOURCE_ENV, "").strip()
+    if not configured:
+        return HTTPSource()
+    if configured.startswith(("http://", "https://")):
+        return HTTPSource(configured)
+    return LocalDirSource(configured)
+
+
+def _manifest() -> Dict[str, str]:
+    path = os.environ.get(MANIFEST_ENV, DEFAULT_MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fetch(name: str, local_path: str, source, expected: Optional[str]) -> None:
+    """Download bundle `name` to `local_path` through a resumable ``.part`` file.
+
+    The file only appears under its final name, via an atomic rename, once it
+    is complete and matches `expected` (when given), so a worker killed
+    mid-download leaves nothing that would later be mistaken for a bundle.
+    """
+    part_path = f"{local_path}.part"
+
+    for attempt in range(1, FETCH_RETRIES + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        try:
+            chunks, start = source.open(name, offset)
+            with open(part_path, "r+b" if os.path.exists(part_path) else "wb") as f:
+                f.seek(start)
+                f.truncate()
+                for chunk in chunks:
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        except (requests.RequestException, OSError) as exc:
+            if attempt == FETCH_RETRIES:
+                raise BundleFetchError(f"Could not fetch bundle '{name}': {exc}") from exc
+            time.sleep(attempt)
+            continue
+
+        if expected and sha256_file(part_path) != expected:
+            os.remove(part_path)
+            if attempt == FETCH_RETRIES:
+                raise BundleFetchError(f"Bundle '{name}' does not match its SHA-256 in the manifest")
+            continue
+
+        os.replace(part_path, local_path)
+        return
 
 
-def _download_if_needed(name: str) -> str:
-    """Ensure the bundle file for `name` exists locally, downloading from GitHub Releases if needed.
+def _download_if_needed(name: str, source=None) -> str:
+    """Ensure the bundle file for `name` exists locally, fetching it from `source` if needed.
 
-    Returns the local path to the bundle file.
+    `source` defaults to ``get_source()``. A local file listed in the manifest
+    is checked against its SHA-256 once per process and fetched again if it
+    does not match. Returns the local path to the bundle file.
     """
     if name not in MODEL_URLS or name not in MODEL_FILENAMES:
         raise ValueError(f"Unknown model bundle name: {name}")
 
-    backend_dir = os.path.dirname(__file__)
-    local_path = os.path.join(backend_dir, MODEL_FILENAMES[name])
-
-    if os.path.exists(local_path):
+    local_path = os.path.join(BACKEND_DIR, MODEL_FILENAMES[name])
+    expected = _manifest().get(MODEL_FILENAMES[name])
+    if os.path.exists(local_path) and (not expected or local_path in _VERIFIED):
         return local_path
 
-    url = MODEL_URLS[name]
-    os.makedirs(backend_dir, exist_ok=True)
+    with _FETCH_LOCKS[name], open(f"{local_path}.lock", "a") as lock_file:
+        # Other worker processes downloading the same bundle wait here
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
 
-    # Stream download to avoid high memory usage
-    with requests.get(url, stream=True) as resp:
-        resp.raise_for_status()
-        with open(local_path, "wb") as f:
-            for chunk in resp.iter_content(chunk_size=1024 * 1024):  # 1MB chunks
-                if chunk:
-                    f.write(chunk)
+        if os.path.exists(local_path) and local_path not in _VERIFIED:
+            if expected and sha256_file(local_path) != expected:
+                os.remove(local_path)
+            else:
+                _VERIFIED.add(local_path)
+
+        if not os.path.exists(local_path):
+            _fetch(name, local_path, source or get_source(), expected)
+            _VERIFIED.add(local_path)
 
     return local_path
 
 
+def prefetch(names: Optional[Iterable[str]] = None, max_workers: int = 4, source=None) -> Dict[str, str]:
+    """Fetch several bundles concurrently; returns {name: local path}.
+
+    Bundles that already have a columnar artifact are skipped, since
+    ``get_bundle`` will not read their pickle.
+    """
+    names = [n for n in (MODEL_FILENAMES if names is None else names) if not is_artifact(artifact_path(n))]
+    if not names:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(names)))) as pool:
+        paths = pool.map(lambda n: _download_if_needed(n, source), names)
+        return dict(zip(names, paths))
+
+
+def write_manifest(names: Optional[Iterable[str]] = None, path: Optional[str] = None) -> Dict[str, str]:
+    """Record the SHA-256 of the local bundle files in the manifest."""
+    path = path or os.environ.get(MANIFEST_ENV, DEFAULT_MANIFEST)
+    manifest = _manifest()
+    for name in (MODEL_FILENAMES if names is None else names):
+        local_path = os.path.join(BACKEND_DIR, MODEL_FILENAMES[name])
+        if os.path.exists(local_path):
+            manifest[MODEL_FILENAMES[name]] = sha256_file(local_path)
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def artifact_path(name: str) -> str:
+    """Directory of the columnar artifact for `name` (see bundle_format.py / build_bundle.py)."""
+    if name not in MODEL_FILENAMES:
+        raise ValueError(f"Unknown model bundle name: {name}")
+
+    stem = os.path.splitext(MODEL_FILENAMES[name])[0]
+    return os.path.join(BACKEND_DIR, stem)
+
+
 def get_bundle(name: str) -> Dict[str, Any]:
-    """Return the unpickled bundle for the given logical model name.
+    """Return the bundle for the given logical model name.
 
-    The bundle is downloaded from GitHub Releases to the server only once, then
-    cached in memory for subsequent calls.
+    A converted columnar artifact next to this file is memory-mapped when
+    present; otherwise the pickle is fetched from the configured source to the
+    server only once and unpickled. Either way the bundle is cached in memory
+    for subsequent calls.
     """
-    with _LOCK:
+    if name not in MODEL_FILENAMES:
+        raise ValueError(f"Unknown model bundle name: {name}")
+
+    with _LOAD_LOCKS[name]:
         if name in _BUNDLES:
             return _BUNDLES[name]
 
-        local_path = _download_if_needed(name)
-        with open(local_path, "rb") as f:
-            bundle = pickle.load(f)
+        if is_artifact(artifact_path(name)):
+            start = time.perf_counter()
+            bundle = load_artifact(artifact_path(name))
+        else:
+            local_path = _download_if_needed(name)
+            # Download time is not load time
+            start = time.perf_counter()
+            with open(local_path, "rb") as f:
+                bundle = pickle.load(f)
+        BUNDLE_LOAD_SECONDS.observe(time.perf_counter() - start, bundle=name)
 
+        _VERSIONS[name] = _on_disk_version(name)
         _BUNDLES[name] = bundle
         return bundle
+
+
+def _content_digest(path: str) -> str:
+    """SHA-256 of the file at `path`, hashed once per process for each size and mtime it has."""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _DIGESTS:
+        _DIGESTS[key] = sha256_file(path)
+    return _DIGESTS[key]
+
+
+def _on_disk_version(name: str) -> str:
+    path = artifact_path(name)
+    if is_artifact(path):
+        build = read_meta(path).get("build") or {}
+        if "version" in build:
+            return build["version"]
+        return _content_digest(os.path.join(path, "meta.json"))[:16]
+
+    # A bundle listed in the manifest has been checked against it (see _download_if_needed)
+    expected = _manifest().get(MODEL_FILENAMES[name])
+    if expected:
+        return expected[:16]
+    return _content_digest(os.path.join(BACKEND_DIR, MODEL_FILENAMES[name]))[:16]
+
+
+def bundle_version(name: str) -> str:
+    """Identifier of the data bundle `name` is served from, for cache keys and ETags.
+
+    The build version recorded by build_bundle.py when the artifact has one,
+    otherwise the bundle file's SHA-256 from the manifest or, without one, of
+    its contents. Identical bytes get the same version on every host.
+    """
+    if name in _VERSIONS:
+        return _VERSIONS[name]
+    return _on_disk_version(name)
+
+
+def set_bundle(name: str, bundle: Dict[str, Any]) -> None:
+    """Serve `bundle` for `name` from now on instead of loading one (used by build_bundle.py)."""
+    if name not in MODEL_FILENAMES:
+        raise ValueError(f"Unknown model bundle name: {name}")
+
+    with _LOAD_LOCKS[name]:
+        _VERSIONS[name] = "unbuilt"
+        _BUNDLES[name] = bundle
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fetch model bundles (all by default) ahead of serving.")
+    parser.add_argument("bundles", nargs="*", metavar="bundle", help=f"any of {', '.join(MODEL_FILENAMES)}")
+    parser.add_argument("--write-manifest", action="store_true",
+                        help="record the SHA-256 of the fetched bundles in the manifest")
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.bundles) - set(MODEL_FILENAMES))
+    if unknown:
+        parser.error(f"unknown bundle(s): {', '.join(unknown)}")
+
+    names = args.bundles or list(MODEL_FILENAMES)
+    for name, path in prefetch(names).items():
+        print(f"{name}: {path}")
+    if args.write_manifest:
+        write_manifest(names)
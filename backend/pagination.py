@@ -0,0 +1,85 @@
+"""Cursor-based paging over single-title recommendations.
+
+The first page of a paged request ranks the catalog once, down to
+``PAGINATION_DEPTH`` items, and keeps the ranked rows and scores in a
+bounded cache (``RANKING_CACHE_SIZE`` rankings, see result_cache.py for the
+LRU/TTL behaviour). Every page is a slice of that ranking, so paging deeper
+costs a cache lookup and the records of one page.
+
+Each page comes with an opaque cursor for the next one. It carries
+everything needed to rebuild the ranking (domain, title, filters and the
+bundle version it was ranked on) plus the page position, so a cursor whose
+ranking was evicted, or that is used on another worker, is answered by
+ranking again; rankings are deterministic. Cursors from a different bundle
+version are refused with ``StaleCursor`` rather than paging through a
+different ranking.
+"""
+import base64
+import binascii
+import json
+import os
+from typing import NamedTuple, Optional
+
+from filters import FILTER_PARAMS, Filters, parse_filters
+from result_cache import ResultCache
+
+DEPTH_ENV = "PAGINATION_DEPTH"
+CACHE_SIZE_ENV = "RANKING_CACHE_SIZE"
+
+DEFAULT_DEPTH = 500
+DEFAULT_CACHE_SIZE = 256
+
+# Largest page a request or a cursor may ask for
+MAX_PAGE_SIZE = 100
+
+
+class StaleCursor(LookupError):
+    """A cursor was issued for a bundle version that is no longer served."""
+
+
+class Cursor(NamedTuple):
+    """Position in a paged ranking (see the module docstring)."""
+
+    domain: str
+    version: str
+    title: str
+    filters: Filters
+    offset: int
+    limit: int
+
+    def encode(self) -> str:
+        payload = [self.domain, self.version, self.title, self.filters.key(), self.offset, self.limit]
+        raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "Cursor":
+        """The cursor `token` stands for; raises ValueError if it is not one."""
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            domain, version, title, filters, offset, limit = json.loads(raw)
+            # Filters are checked like a request's, so a forged cursor cannot smuggle in bad values
+            if not isinstance(filters, list) or len(filters) != len(FILTER_PARAMS):
+                raise ValueError("filters")
+            cursor = cls(str(domain), str(version), str(title), parse_filters(dict(zip(FILTER_PARAMS, filters))),
+                         int(offset), int(limit))
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as exc:
+            raise ValueError("Invalid cursor") from exc
+        if cursor.offset < 0 or not 1 <= cursor.limit <= MAX_PAGE_SIZE:
+            raise ValueError("Invalid cursor")
+        return cursor
+
+    def next(self, total: int) -> Optional["Cursor"]:
+        """The cursor of the following page of a ranking with `total` items, or None after the last."""
+        offset = self.offset + self.limit
+        return self._replace(offset=offset) if offset < total else None
+
+
+def depth_from_env() -> int:
+    """How many items deep a paged ranking goes."""
+    return max(1, int(os.environ.get(DEPTH_ENV, DEFAULT_DEPTH)))
+
+
+def ranking_cache_from_env() -> ResultCache:
+    """Process-local cache of rankings; never shared, values are NumPy arrays."""
+    return ResultCache(max_entries=int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE)))
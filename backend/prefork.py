@@ -0,0 +1,96 @@
+"""Helpers for pre-fork serving, where workers share the master's loaded models.
+
+A pre-fork server (gunicorn with ``preload_app``, see gunicorn.conf.py) imports
+the app once in the master and forks the workers afterwards, so every page the
+master filled while loading bundles is shared copy-on-write. Pages stay shared
+only as long as nobody writes to them, and two things write to them by
+accident: the cyclic garbage collector, which updates the header of every
+tracked object it visits, and code that modifies arrays in place.
+``freeze`` guards against both before the fork; ``memory_report`` shows how
+much of a worker's memory is still shared.
+"""
+import gc
+import os
+from types import ModuleType
+from typing import Dict, Iterable
+
+import numpy as np
+from scipy import sparse
+
+from ann_index import AnnIndex
+from compact import QuantizedVector
+from filters import ColumnFloors, FilterIndex
+from genre_index import GenreIndex
+from query_index import QueryIndex
+from similarity import TagSimilarity
+from title_search import TitleSearch
+from topk_index import TopKIndex
+
+# Per-domain index objects whose array attributes are made read-only too
+_INDEX_TYPES = (AnnIndex, ColumnFloors, FilterIndex, GenreIndex, QueryIndex, TagSimilarity, TitleSearch, TopKIndex,
+                QuantizedVector)
+
+SMAPS_ROLLUP = "/proc/self/smaps_rollup"
+
+# smaps_rollup fields reported by memory_report, in kB
+_MEMORY_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def _set_read_only(value, seen: set) -> int:
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+        return 1
+    if sparse.issparse(value) and value.format in ("csr", "csc"):
+        return sum(_set_read_only(part, seen) for part in (value.data, value.indices, value.indptr))
+    if isinstance(value, _INDEX_TYPES):
+        return sum(_set_read_only(attr, seen) for attr in vars(value).values())
+    if isinstance(value, dict):
+        return sum(_set_read_only(item, seen) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_set_read_only(item, seen) for item in value)
+    return 0
+
+
+def freeze(modules: Iterable[ModuleType]) -> int:
+    """Prepare loaded recommender `modules` to be shared by forked workers.
+
+    Marks the NumPy arrays they hold (directly, in dicts, in sparse matrices
+    and in their index objects) read-only so no request can dirty a shared
+    page by writing to one, then collects garbage and moves every surviving
+    object into the GC's permanent generation with ``gc.freeze()`` so workers'
+    collections never touch them. Returns the number of arrays frozen.
+    """
+    seen: set = set()
+    frozen = sum(_set_read_only(value, seen) for module in modules for value in vars(module).values())
+
+    gc.collect()
+    gc.freeze()
+    return frozen
+
+
+def memory_report() -> Dict[str, int]:
+    """Shared vs private memory of the current process, in kB.
+
+    Read from /proc/self/smaps_rollup, so only available on Linux; elsewhere
+    only the pid is returned. In a healthy pre-fork worker most of the model
+    data shows up as ``shared_kb``.
+    """
+    report = {"pid": os.getpid()}
+    try:
+        with open(SMAPS_ROLLUP, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        return report
+
+    for line in lines:
+        field, _, rest = line.partition(":")
+        if field in _MEMORY_FIELDS:
+            report[f"{field.lower()}_kb"] = int(rest.split()[0])
+
+    report["shared_kb"] = report.get("shared_clean_kb", 0) + report.get("shared_dirty_kb", 0)
+    report["private_kb"] = report.get("private_clean_kb", 0) + report.get("private_dirty_kb", 0)
+    return report
@@ -0,0 +1,69 @@
+from typing import Any, Mapping, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+class QueryIndex:
+    """Free-text queries scored against a catalog's TF-IDF rows through an inverted index.
+
+    The L2-normalised TF-IDF matrix is kept transposed, as term -> postings
+    (the items containing the term and their weights). A query vectorised with
+    the same vectorizer only touches the postings of its own terms, so a short
+    query costs time proportional to how many items share its words rather
+    than to the catalog size. Scores are cosine similarities, as in
+    ``TagSimilarity``.
+    """
+
+    def __init__(self, matrix):
+        # Row t of the transposed CSR matrix lists the items containing term t
+        self.postings = sparse.csr_matrix(sparse.csr_matrix(matrix).T)
+        self.postings.sort_indices()
+
+    @property
+    def n_terms(self) -> int:
+        return self.postings.shape[0]
+
+    def to_bundle(self) -> dict:
+        """The postings as a bundle entry, for build_bundle.py."""
+        return {"query_index.postings": self.postings}
+
+    @classmethod
+    def from_bundle(cls, bundle: Mapping[str, Any], matrix) -> "QueryIndex":
+        """The index stored in a built bundle, or one built from the normalised TF-IDF `matrix` if it has none."""
+        if "query_index.postings" not in bundle:
+            return cls(matrix)
+        index = cls.__new__(cls)
+        index.postings = bundle["query_index.postings"]
+        return index
+
+    def astype(self, dtype) -> None:
+        """Store the posting weights in `dtype`, e.g. float32."""
+        self.postings = self.postings.astype(dtype)
+
+    def similarities(self, query_vector) -> Tuple[np.ndarray, np.ndarray]:
+        """Items sharing a term with `query_vector` and their cosine similarity to it.
+
+        `query_vector` is a 1 x n_terms row from the catalog's vectorizer
+        (L2-normalised, as ``TfidfVectorizer.transform`` returns it). Returns
+        the matching item positions in ascending order and their similarities.
+        """
+        query = sparse.csr_matrix(query_vector)
+        if query.shape[1] != self.n_terms:
+            raise ValueError(f"Query has {query.shape[1]} terms, the index {self.n_terms}")
+
+        terms = query.indices
+        if terms.size == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=self.postings.dtype)
+
+        indptr = self.postings.indptr
+        starts, ends = indptr[terms], indptr[terms + 1]
+        lengths = ends - starts
+        positions = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+
+        items = self.postings.indices[positions]
+        weights = self.postings.data[positions] * np.repeat(query.data, lengths).astype(self.postings.dtype)
+
+        rows, inverse = np.unique(items, return_inverse=True)
+        sims = np.bincount(inverse, weights=weights, minlength=rows.size).astype(self.postings.dtype, copy=False)
+        return rows.astype(np.intp, copy=False), sims
@@ -0,0 +1,136 @@
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Dict, Iterable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+def top_n_indices(scores: np.ndarray, top_n: int,
+                  exclude: Optional[Union[int, Iterable[int]]] = None,
+                  mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """Return the positions of the `top_n` highest `scores`, best first.
+
+    Positions listed in `exclude` (typically the input item) are never returned.
+    Only ``top_n + len(exclude)`` candidates are selected with ``argpartition``
+    and sorted, so the cost is linear in the catalog size rather than
+    ``O(N log N)``. Ties are broken by position to keep results deterministic.
+    If given, only positions where the boolean `mask` is set are considered
+    (see filters.py).
+    """
+    scores = np.asarray(scores)
+    n = scores.shape[0]
+
+    if exclude is None:
+        excluded = np.empty(0, dtype=np.intp)
+    else:
+        excluded = np.unique(np.atleast_1d(np.asarray(exclude, dtype=np.intp)))
+
+    if mask is not None:
+        mask = np.array(mask, dtype=bool)
+        mask[excluded] = False
+        allowed = np.flatnonzero(mask)
+        return allowed[top_n_indices(scores[allowed], top_n)]
+
+    k = min(max(int(top_n), 0) + excluded.size, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+
+    if excluded.size:
+        candidates = candidates[~np.isin(candidates, excluded)]
+
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order][:top_n]
+
+
+def merge_seeds(input_idxs: Sequence[Optional[int]],
+                seed_weights: Optional[Sequence[float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Combine resolved seed positions and their weights for profile scoring.
+
+    Unresolved seeds (None) are dropped and repeated seeds have their weights
+    summed. Weights default to 1 and must be positive. Returns the distinct
+    positions and their weights as aligned arrays.
+    """
+    if seed_weights is None:
+        seed_weights = [1.0] * len(input_idxs)
+    if len(seed_weights) != len(input_idxs):
+        raise ValueError("seed_weights must have one weight per title")
+
+    merged: Dict[int, float] = {}
+    for idx, weight in zip(input_idxs, seed_weights):
+        weight = float(weight)
+        if not weight > 0:
+            raise ValueError("seed_weights must be positive")
+        if idx is not None:
+            merged[int(idx)] = merged.get(int(idx), 0.0) + weight
+
+    return np.fromiter(merged.keys(), dtype=np.intp), np.fromiter(merged.values(), dtype=np.float64)
+
+
+# Upper bound on score cells (batch rows x catalog size) materialised at once
+BATCH_MAX_CELLS = 8_000_000
+
+
+def top_n_indices_batch(scores: np.ndarray, top_n: int, exclude: Sequence[int],
+                        mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise ``top_n_indices`` over a (B, N) score matrix.
+
+    Row ``b`` excludes position ``exclude[b]``, and every row the positions
+    where the boolean `mask`, if given, is not set. Returns the selected
+    positions and their scores, both shaped (B, k) with ``k = min(top_n,
+    N - 1)``; with a `mask`, ``k`` is at most the number of positions it
+    keeps and a row's excluded input may still fill its last place with a
+    score of ``-inf``. `scores` is modified in place.
+    """
+    n_rows, n = scores.shape
+    k = min(max(int(top_n), 0), n - 1)
+    if mask is not None:
+        k = min(k, int(np.count_nonzero(mask)))
+    if k <= 0 or n_rows == 0:
+        empty = np.empty((n_rows, 0), dtype=np.intp)
+        return empty, np.empty((n_rows, 0), dtype=scores.dtype)
+
+    if mask is not None:
+        scores[:, ~mask] = -np.inf
+    scores[np.arange(n_rows), np.asarray(exclude, dtype=np.intp)] = -np.inf
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+
+    order = np.lexsort((candidates, -candidate_scores), axis=-1)
+    rows = np.take_along_axis(candidates, order, axis=1)
+    return rows, np.take_along_axis(candidate_scores, order, axis=1)
+
+
+def top_n_batch(score_fn: Callable[[np.ndarray], np.ndarray], input_idxs: Sequence[int],
+                top_n: int, n_items: int,
+                stage: Optional[Callable[[str], ContextManager]] = None,
+                mask: Optional[np.ndarray] = None) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """Top-N neighbours of each item in `input_idxs`, scored in bulk.
+
+    `score_fn` maps an array of B input positions to a (B, n_items) score
+    matrix. Inputs are deduplicated and processed in chunks small enough to
+    keep at most ``BATCH_MAX_CELLS`` scores in memory. Returns
+    ``{input_idx: (rows, scores)}``, each item excluded from its own list
+    and, if a boolean `mask` is given, only positions where it is set kept.
+    If given, ``stage("select")`` times the selection of each chunk (see
+    metrics.stage_timer).
+    """
+    unique = np.unique(np.asarray(list(input_idxs), dtype=np.intp))
+    chunk_size = max(1, BATCH_MAX_CELLS // max(n_items, 1))
+
+    selections = {}
+    for start in range(0, len(unique), chunk_size):
+        chunk = unique[start:start + chunk_size]
+        scores = score_fn(chunk)
+        with stage("select") if stage is not None else nullcontext():
+            rows, scores = top_n_indices_batch(scores, top_n, chunk, mask)
+        for i, idx in enumerate(chunk):
+            if mask is None:
+                selections[int(idx)] = (rows[i], scores[i])
+            else:
+                keep = scores[i] > -np.inf
+                selections[int(idx)] = (rows[i][keep], scores[i][keep])
+    return selections
@@ -0,0 +1,145 @@
+"""Cache of finished recommendation results, shared by all requests of a process.
+
+Entries are evicted least-recently-used once ``max_entries`` is reached and
+expire ``ttl`` seconds after they were stored. An optional shared backend
+(any Redis-like client with ``get`` and ``set(..., ex=ttl)``, e.g. a local
+Redis) lets several worker processes reuse each other's results; values are
+stored there as JSON.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from title_index import normalize_title
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL = 600.0  # seconds
+
+# Environment overrides for the process-wide cache used by the API
+MAX_ENTRIES_ENV = "RESULT_CACHE_SIZE"
+TTL_ENV = "RESULT_CACHE_TTL"
+REDIS_URL_ENV = "RESULT_CACHE_REDIS_URL"
+
+_SHARED_PREFIX = "unirex:result:"
+
+
+def cache_key(domain: str, title: str, top_n: int, weights: Sequence[float], version: str,
+              filters: Optional[list] = None) -> str:
+    """Key of a single-title result: the same for every spelling that normalises alike.
+
+    `filters` is the ``Filters.key()`` of a filtered request (see filters.py).
+    """
+    parts = [domain, version, normalize_title(title), int(top_n), [float(w) for w in weights]]
+    if filters is not None:
+        parts.append(filters)
+    return json.dumps(parts)
+
+
+def etag(key: str) -> str:
+    """Strong ETag for the result stored under `key` (results are deterministic per key)."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+class ResultCache:
+    """Thread-safe LRU + TTL cache with hit/miss counters."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL, shared=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+                          "shared_errors": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        """The cached value for `key`, or None. Returned values are shared; do not modify them."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return value
+                del self._entries[key]
+                self._counters["expirations"] += 1
+
+        value = self._shared_get(key)
+        with self._lock:
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["shared_hits"] += 1
+        self._store(key, value, now)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        self._store(key, value, time.monotonic())
+        self._shared_put(key, value)
+
+    def _store(self, key: str, value: Any, now: float) -> None:
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _shared_get(self, key: str) -> Optional[Any]:
+        if self.shared is None:
+            return None
+        try:
+            payload = self.shared.get(_SHARED_PREFIX + key)
+        except Exception:
+            self._count("shared_errors")
+            return None
+        return None if payload is None else json.loads(payload)
+
+    def _shared_put(self, key: str, value: Any) -> None:
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(_SHARED_PREFIX + key, json.dumps(value), ex=max(1, int(self.ttl)))
+        except Exception:
+            self._count("shared_errors")
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counters, "entries": len(self._entries), "max_entries": self.max_entries,
+                    "ttl": self.ttl, "shared": self.shared is not None}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def shared_backend_from_env():
+    """Redis client for RESULT_CACHE_REDIS_URL, or None if unset or the redis package is missing."""
+    url = os.environ.get(REDIS_URL_ENV, "").strip()
+    if not url:
+        return None
+    try:
+        import redis
+    except ImportError:
+        return None
+    return redis.Redis.from_url(url, socket_timeout=0.05)
+
+
+def cache_from_env() -> ResultCache:
+    return ResultCache(
+        max_entries=int(os.environ.get(MAX_ENTRIES_ENV, DEFAULT_MAX_ENTRIES)),
+        ttl=float(os.environ.get(TTL_ENV, DEFAULT_TTL)),
+        shared=shared_backend_from_env(),
+    )
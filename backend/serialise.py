@@ -0,0 +1,122 @@
+"""Building and encoding recommendation responses.
+
+``RecordBuilder`` turns selected rows into response records by indexing
+per-column arrays pulled out of the catalog once at load, instead of slicing
+the DataFrame and calling ``to_dict`` on every request. Scores can be rounded
+to ``SCORE_DECIMALS`` places.
+
+``dumps`` encodes responses with orjson when it is installed and with the
+standard library otherwise; ``JSONProvider`` makes Flask's ``jsonify`` use it.
+Keys keep the order records are built in rather than being sorted. NaN and
+infinite floats (e.g. missing ratings) are written as ``null`` either way.
+"""
+import json
+import math
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+SCORE_DECIMALS_ENV = "SCORE_DECIMALS"
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def score_decimals_from_env() -> Optional[int]:
+    """Decimal places scores are rounded to, or None to return them unrounded."""
+    value = os.environ.get(SCORE_DECIMALS_ENV, "").strip()
+    if not value:
+        return None
+    decimals = int(value)
+    if decimals < 0:
+        raise ValueError(f"{SCORE_DECIMALS_ENV} must not be negative")
+    return decimals
+
+
+class RecordBuilder:
+    """Response records of a catalog's `columns` plus a score, for selected rows."""
+
+    def __init__(self, frame: pd.DataFrame, columns: Sequence[str], score_decimals: Optional[int] = None):
+        self.keys = (*columns, "score")
+        self.score_decimals = score_decimals
+        # Numeric columns are views of the frame; text columns share its str objects
+        self._values = [frame[column].to_numpy() for column in columns]
+
+    def __call__(self, rows: np.ndarray, scores: np.ndarray) -> List[dict]:
+        rows = np.asarray(rows, dtype=np.intp)
+        scores = np.asarray(scores, dtype=np.float64)
+        if self.score_decimals is not None:
+            scores = np.round(scores, self.score_decimals)
+
+        # tolist() converts each column to Python objects in one call
+        columns = [values[rows].tolist() for values in self._values]
+        columns.append(scores.tolist())
+        keys = self.keys
+        return [dict(zip(keys, values)) for values in zip(*columns)]
+
+    def batch(self, selections: Sequence[Tuple[np.ndarray, np.ndarray]]) -> List[List[dict]]:
+        """Records of many (rows, scores) selections, built in a single pass."""
+        if not selections:
+            return []
+        all_rows = np.concatenate([np.asarray(rows, dtype=np.intp) for rows, _ in selections])
+        all_scores = np.concatenate([np.asarray(scores, dtype=np.float64) for _, scores in selections])
+        records = self(all_rows, all_scores)
+
+        grouped, start = [], 0
+        for rows, _ in selections:
+            grouped.append(records[start:start + len(rows)])
+            start += len(rows)
+        return grouped
+
+
+def _null_non_finite(obj):
+    """`obj` with NaN and infinite floats replaced by None, as orjson writes them."""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _null_non_finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_null_non_finite(value) for value in obj]
+    return obj
+
+
+def dumps(obj, default=None) -> bytes:
+    """Compact UTF-8 JSON of `obj`."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+    try:
+        text = json.dumps(obj, default=default, ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+    except ValueError:
+        # The standard library would write NaN, which is not JSON
+        text = json.dumps(_null_non_finite(obj), default=default, ensure_ascii=False, separators=(",", ":"))
+    return text.encode("utf-8")
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider encoding compact responses with ``dumps``.
+
+    Indented output (debug mode, or ``compact = False``) is left to the
+    standard library.
+    """
+
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs) -> str:
+        default = kwargs.pop("default", self.default)
+        if set(kwargs) - {"separators"} or kwargs.get("separators", (",", ":")) != (",", ":"):
+            return super().dumps(obj, default=default, **kwargs)
+        return dumps(obj, default=default).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
@@ -2,25 +2,45 @@ import pickle
 import numpy as np
 import pandas as pd
 import re
-from sklearn.metrics.pairwise import cosine_similarity
+from functools import lru_cache
 import os
 
-from model_loader import get_bundle
+from ann_index import STATIC_CANDIDATES, AnnIndex
+from filters import FilterIndex
+from genre_index import GenreIndex
+from metrics import stage_timer
+from model_loader import bundle_version, get_bundle
+from query_index import QueryIndex
+from ranking import merge_seeds, top_n_batch, top_n_indices
+from serialise import RecordBuilder, score_decimals_from_env
+from similarity import TagSimilarity
+from title_index import TitleIndex
+from title_search import TitleSearch
+from topk_index import load_topk_index
 
 # Load bundled data via shared loader (downloads from GitHub Releases if needed)
 bundle = get_bundle("tv")
 
+# Times the request pipeline stages (see metrics.py)
+stage = stage_timer("tv")
+
 # Unpack components
-model = bundle['model']
+model = bundle.get('model')
 tfidf = bundle['tfidf']
-scaler = bundle['scaler']
+scaler = bundle.get('scaler')
 tv = bundle['tv']
 tfidf_matrix = bundle['tfidf_matrix']
 normalized_ratings = bundle['normalized_ratings']
 normalized_popularity = bundle['normalized_popularity']
 
-# Precompute cosine similarity for tags
-tag_similarities = cosine_similarity(tfidf_matrix)
+# Tag similarity rows are computed on demand from the sparse TF-IDF matrix
+tag_similarities = TagSimilarity(tfidf_matrix)
+
+# Term -> postings index over the same rows, for free-text queries
+query_index = QueryIndex.from_bundle(bundle, tag_similarities.matrix)
+
+# Approximate tag neighbours for large catalogs (see ann_index.py), if the bundle was built with them
+ann_index = AnnIndex.from_bundle(bundle)
 
 # Clean text utility
 def clean_text(text):
@@ -30,7 +50,7 @@ def clean_text(text):
     words = [word for word in text.split() if word not in stop_words]
     return ' '.join(words).strip()
 
-# Add cleaned tags if not present
+# Add cleaned tags if the bundle was not built with them (see build_bundle.py)
 if 'cleaned_tags' not in tv.columns:
     tv['cleaned_tags'] = tv['tags'].fillna('').apply(clean_text)
 
@@ -44,57 +64,292 @@ GENRE_SETTINGS = {
     'default': {'keywords': set(), 'weight': 1.0, 'min_rating': 6.0}
 }
 
-# Main recommendation function
-def recommend_tv_series(title, top_n=10, weights=(0.4, 0.3, 0.2, 0.1)):
-    alpha, beta, gamma, delta = weights  # genre, popularity, tags, rating
+# Normalised title -> row id, built once, with prefix/fuzzy search for misses
+title_index = TitleIndex.from_bundle(bundle, tv['title'])
+title_search = TitleSearch.from_bundle(bundle, title_index)
+
+def resolve_title(title):
+    """Row of `title`: exact normalised match first, then the closest prefix/fuzzy match."""
+    with stage("lookup"):
+        input_idx = title_index.lookup(title)
+        if input_idx is None:
+            input_idx = title_search.resolve(title)
+    return input_idx
+
+def suggest_titles(query, limit=10):
+    """Autocomplete suggestions for `query` spelled exactly as in the catalog."""
+    return [{'title': tv['title'].iat[row], 'score': score} for row, score in title_search.suggest(query, limit)]
+
+# Genre sets encoded once for vectorised weighted-Jaccard similarity
+genre_index = GenreIndex.from_bundle(
+    bundle,
+    tv['genres'],
+    weights={genre: setting['weight'] for genre, setting in GENRE_SETTINGS.items()},
+    default_weight=GENRE_SETTINGS['default']['weight'],
+)
+
+# Tag boost for each primary genre: 1.3 for rows whose cleaned tags mention one of its keywords
+_tag_sets = [set(tags.split()) for tags in tv['cleaned_tags']]
+CONTENT_BOOST = {
+    genre: np.array([1.3 if setting['keywords'] & tags else 1.0 for tags in _tag_sets])
+    for genre, setting in GENRE_SETTINGS.items()
+}
+del _tag_sets
+
+DEFAULT_WEIGHTS = (0.4, 0.3, 0.2, 0.1)
+
+# Catalog columns returned with each recommendation, read straight from the selected rows
+RESULT_COLUMNS = ['title', 'genres', 'average_rating', 'popularity']
+build_records = RecordBuilder(tv, RESULT_COLUMNS, score_decimals_from_env())
+
+# Precomputed neighbours for the default weights (see build_topk_index.py), if built
+topk_index = load_topk_index("tv", len(tv), DEFAULT_WEIGHTS, bundle_version("tv"))
+
+# Free-text search: weights of tag relevance, rating and popularity
+DEFAULT_SEARCH_WEIGHTS = (0.7, 0.2, 0.1)
+
+# First listed genre of a series, which selects its keyword boost
+def primary_genre(input_idx):
+    input_genres = tv['genres'].iat[input_idx].lower().split()
+    return input_genres[0] if input_genres else 'default'
 
-    # Robust title matching
-    title_lower = title.lower().strip()
-    title_map = tv['title'].str.lower().str.strip()
-    matched_indices = title_map[title_map == title_lower].index
+# Genre, rating and popularity bitmaps for request filters (see filters.py); each series'
+# own rating floor for genre_min_rating is the min_rating of its primary genre
+_primary_genres = tv['genres'].fillna('').astype(str).str.lower().str.split().str[0].fillna('default')
+filter_index = FilterIndex(
+    genre_index, tv['average_rating'], normalized_popularity, title_index,
+    row_min_rating=_primary_genres.map(
+        lambda genre: GENRE_SETTINGS.get(genre, GENRE_SETTINGS['default'])['min_rating']
+    ).to_numpy(dtype=np.float64),
+)
+del _primary_genres
 
-    if len(matched_indices) == 0:
-        # Fallback: try partial match
-        partial_matches = title_map[title_map.str.contains(title_lower, na=False)]
-        if not partial_matches.empty:
-            matched_indices = partial_matches.index[:1]
-        else:
-            return {"error": f"TV Series titled '{title}' not found in dataset."}
+def filter_mask(filters):
+    """Mask of the rows passing request `filters`, or None if they keep every row."""
+    with stage("filter"):
+        return filter_index.mask(filters)
 
-    input_idx = matched_indices[0]
+# Final score of every series against the series at input_idx
+def compute_scores(input_idx, weights=DEFAULT_WEIGHTS):
+    alpha, beta, gamma, delta = weights  # genre, popularity, tags, rating
 
     # Genre similarity
-    input_genres = [g.lower() for g in tv.loc[input_idx, 'genres'].split()]
-    primary_genre = input_genres[0] if input_genres else 'default'
-    settings = GENRE_SETTINGS.get(primary_genre, GENRE_SETTINGS['default'])
-
-    def genre_similarity(other_genres):
-        g_set = set(other_genres.lower().split())
-        input_set = set(input_genres)
-        union = input_set | g_set
-        intersection = input_set & g_set
-        weighted_intersection = sum(GENRE_SETTINGS.get(g, GENRE_SETTINGS['default'])['weight'] for g in intersection)
-        weighted_union = sum(GENRE_SETTINGS.get(g, GENRE_SETTINGS['default'])['weight'] for g in union)
-        return weighted_intersection / weighted_union if weighted_union else 0
-
-    genre_sim = tv['genres'].apply(genre_similarity).values
+    with stage("genre_sim"):
+        genre_sim = alpha * genre_index.weighted_jaccard(input_idx)
     popularity_sim = normalized_popularity
 
-    input_tags = set(tv.loc[input_idx, 'cleaned_tags'].split())
-    content_boost = np.array([
-        1.3 if settings['keywords'] & set(tags.split()) else 1.0
-        for tags in tv['cleaned_tags']
-    ])
+    with stage("tag_sim"):
+        content_boost = CONTENT_BOOST.get(primary_genre(input_idx), CONTENT_BOOST['default'])
+        tag_sim = gamma * tag_similarities[input_idx] * content_boost
+
+    with stage("combine"):
+        return (
+            genre_sim +
+            beta * popularity_sim +
+            tag_sim +
+            delta * normalized_ratings
+        )
+
+# What the ANN index embeds (see build_bundle.py --ann): tag and genre vectors weighted as in the score
+def ann_features(weights=DEFAULT_WEIGHTS):
+    alpha, beta, gamma, delta = weights  # genre, popularity, tags, rating
+    return [(tag_similarities.matrix, gamma), (genre_index.row_vectors(), alpha)]
+
+# The popularity and rating part of the score, added to ANN similarities, and the series best on it alone,
+# which are re-scored along with every ANN candidate set
+@lru_cache(maxsize=4)
+def static_scores(weights):
+    alpha, beta, gamma, delta = weights  # genre, popularity, tags, rating
+    scores = beta * normalized_popularity + delta * normalized_ratings
+    return scores, top_n_indices(scores, STATIC_CANDIDATES)
+
+# What the shared cross-domain space describes each series by (see build_cross_index.py):
+# its tag and genre words, and the rating and popularity part of the score scaled to [0, 1]
+def cross_features(weights=DEFAULT_WEIGHTS):
+    alpha, beta, gamma, delta = weights  # genre, popularity, tags, rating
+    texts = (tv['cleaned_tags'] + ' ' + tv['genres'].fillna('').astype(str).str.lower()).tolist()
+    return texts, np.asarray(static_scores(tuple(weights))[0], dtype=np.float64) / (beta + delta)
+
+# Rows worth scoring exactly for input_idx: approximate neighbours plus the static best
+def candidate_rows(input_idx, weights=DEFAULT_WEIGHTS):
+    with stage("ann"):
+        scores, best = static_scores(tuple(weights))
+        return np.union1d(ann_index.neighbours(input_idx, scores), best)
+
+# compute_scores for the series at `rows` only
+def compute_candidate_scores(input_idx, rows, weights=DEFAULT_WEIGHTS):
+    alpha, beta, gamma, delta = weights  # genre, popularity, tags, rating
+
+    with stage("genre_sim"):
+        genre_sim = alpha * genre_index.weighted_jaccard(input_idx, rows)
+
+    with stage("tag_sim"):
+        content_boost = CONTENT_BOOST.get(primary_genre(input_idx), CONTENT_BOOST['default'])
+        tag_sim = gamma * tag_similarities.subset(input_idx, rows) * content_boost[rows]
+
+    with stage("combine"):
+        return (
+            genre_sim +
+            beta * normalized_popularity[rows] +
+            tag_sim +
+            delta * normalized_ratings[rows]
+        )
+
+# compute_scores for several inputs at once: one row of scores per input
+def compute_scores_batch(input_idxs, weights=DEFAULT_WEIGHTS):
+    alpha, beta, gamma, delta = weights  # genre, popularity, tags, rating
+
+    with stage("genre_sim"):
+        genre_sim = alpha * genre_index.weighted_jaccard_many(input_idxs)
+
+    with stage("tag_sim"):
+        content_boost = np.stack([
+            CONTENT_BOOST.get(primary_genre(idx), CONTENT_BOOST['default'])
+            for idx in input_idxs
+        ])
+        tag_sim = gamma * tag_similarities.rows(input_idxs) * content_boost
+
+    with stage("combine"):
+        return (
+            genre_sim +
+            beta * normalized_popularity +
+            tag_sim +
+            delta * normalized_ratings
+        )
+
+# Final score of every series against a weighted profile of several seed series
+def compute_profile_scores(input_idxs, seed_weights, weights=DEFAULT_WEIGHTS):
+    alpha, beta, gamma, delta = weights  # genre, popularity, tags, rating
+
+    with stage("genre_sim"):
+        genre_sim = alpha * genre_index.profile_jaccard(input_idxs, seed_weights, weighted=True)
+
+    with stage("tag_sim"):
+        # Each seed's keyword boost counts in proportion to its weight
+        content_boost = np.average(
+            np.stack([CONTENT_BOOST.get(primary_genre(idx), CONTENT_BOOST['default']) for idx in input_idxs]),
+            axis=0,
+            weights=seed_weights,
+        )
+        tag_sim = gamma * tag_similarities.profile(input_idxs, seed_weights) * content_boost
+
+    with stage("combine"):
+        return (
+            genre_sim +
+            beta * normalized_popularity +
+            tag_sim +
+            delta * normalized_ratings
+        )
+
+# Main recommendation function
+def rank_tv_series(input_idx, top_n=10, weights=DEFAULT_WEIGHTS, mask=None):
+    """Rows and scores of the `top_n` best recommendations for the series at `input_idx`, best first.
+
+    Only rows set in the boolean `mask` (see filter_mask), if given, are considered.
+    """
+    if mask is None and topk_index is not None and topk_index.covers(top_n, weights):
+        with stage("select"):
+            return topk_index.neighbours(input_idx, top_n)
+
+    # Large catalogs: exact scores for the approximate candidates only
+    if ann_index is not None and ann_index.enabled:
+        rows = candidate_rows(input_idx, weights)
+        final_scores = compute_candidate_scores(input_idx, rows, weights)
+        with stage("select"):
+            best = top_n_indices(final_scores, top_n, exclude=np.flatnonzero(rows == input_idx),
+                                 mask=None if mask is None else mask[rows])
+        # Filters or a short candidate list may leave fewer than requested; the whole catalog is scored then
+        if len(best) == top_n:
+            return rows[best], final_scores[best]
+
+    final_scores = compute_scores(input_idx, weights)
+
+    # Exclude the input itself and rank only the best candidates
+    with stage("select"):
+        rows = top_n_indices(final_scores, top_n, exclude=input_idx, mask=mask)
+    return rows, final_scores[rows]
+
+def recommend_tv_series(title, top_n=10, weights=DEFAULT_WEIGHTS, filters=None):
+    # Robust title matching, falling back to the closest prefix/fuzzy match
+    input_idx = resolve_title(title)
+
+    if input_idx is None:
+        return {"error": f"TV Series titled '{title}' not found in dataset."}
+
+    rows, scores = rank_tv_series(input_idx, top_n, weights, filter_mask(filters))
+    with stage("serialise"):
+        return build_records(rows, scores)
+
+def recommend_tv_series_batch(titles, top_n=10, weights=DEFAULT_WEIGHTS, filters=None):
+    """Recommendations for many titles in one pass, one result per title.
+
+    Each result is a list of records, or an error dict if the title is not in
+    the catalog. Tag and genre similarities for all inputs are computed as
+    matrix products and the top-N of every row is selected in bulk.
+    """
+    input_idxs = [resolve_title(title) for title in titles]
+    found = [idx for idx in input_idxs if idx is not None]
+    mask = filter_mask(filters)
+
+    if mask is None and topk_index is not None and topk_index.covers(top_n, weights):
+        with stage("select"):
+            selections = {idx: topk_index.neighbours(idx, top_n) for idx in found}
+    else:
+        selections = top_n_batch(lambda idxs: compute_scores_batch(idxs, weights), found, top_n, len(tv),
+                                 stage=stage, mask=mask)
+
+    with stage("serialise"):
+        records = iter(build_records.batch([selections[idx] for idx in found]))
+    return [
+        {"error": f"TV Series titled '{title}' not found in dataset."} if idx is None else next(records)
+        for title, idx in zip(titles, input_idxs)
+    ]
+
+def recommend_tv_series_profile(titles, seed_weights=None, top_n=10, weights=DEFAULT_WEIGHTS, filters=None):
+    """Recommendations for a set of liked titles, scored once against their combined profile.
+
+    The seeds' TF-IDF rows and genre sets are blended (optionally weighted per
+    seed via `seed_weights`) into one profile. The catalog is scored against
+    it with the usual formula and all seeds are excluded from the results.
+    Titles that are not in the catalog are ignored.
+    """
+    input_idxs, seed_weights = merge_seeds([resolve_title(title) for title in titles], seed_weights)
+
+    if len(input_idxs) == 0:
+        return {"error": "None of the given TV Series titles were found in dataset."}
+
+    mask = filter_mask(filters)
+    final_scores = compute_profile_scores(input_idxs, seed_weights, weights)
+
+    with stage("select"):
+        rows = top_n_indices(final_scores, top_n, exclude=input_idxs, mask=mask)
+    with stage("serialise"):
+        return build_records(rows, final_scores[rows])
+
+def search_tv_series(query, top_n=10, weights=DEFAULT_SEARCH_WEIGHTS, filters=None):
+    """Recommendations for a free-text description such as "dark sci-fi with time travel".
+
+    The query is vectorised with the bundle's TF-IDF vectorizer and only the
+    series sharing a term with it are scored: their tag similarity to the
+    query blended with rating and popularity. Returns an empty list when no
+    word of the query is in the vocabulary.
+    """
+    relevance, rating, popularity = weights
+    mask = filter_mask(filters)
 
-    final_scores = (
-        alpha * genre_sim +
-        beta * popularity_sim +
-        gamma * tag_similarities[input_idx] * content_boost +
-        delta * normalized_ratings
-    )
+    with stage("lookup"):
+        query_vector = tfidf.transform([clean_text(query)])
+    with stage("tag_sim"):
+        rows, tag_sim = query_index.similarities(query_vector)
 
-    results = tv.copy()
-    results['score'] = final_scores
-    recommendations = results.drop(index=input_idx).sort_values(by='score', ascending=False)
+    with stage("combine"):
+        scores = (
+            relevance * tag_sim +
+            rating * normalized_ratings[rows] +
+            popularity * normalized_popularity[rows]
+        )
 
-    return recommendations[['title', 'genres', 'average_rating', 'popularity', 'score']].head(top_n).reset_index(drop=True).to_dict(orient='records')
+    with stage("select"):
+        best = top_n_indices(scores, top_n, mask=None if mask is None else mask[rows])
+    with stage("serialise"):
+        return build_records(rows[best], scores[best])
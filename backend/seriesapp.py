@@ -2,9 +2,14 @@ from flask import Flask, jsonify
 from flask_cors import CORS 
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
 import re
+from genre_index import GenreIndex
 from model_loader import get_bundle
+from ranking import top_n_indices
+from serialise import RecordBuilder, score_decimals_from_env
+from similarity import TagSimilarity
+from title_index import TitleIndex
+from title_search import TitleSearch
 
 
 app = Flask(__name__)
@@ -37,9 +42,8 @@ def _ensure_series_bundle_loaded():
     normalized_ratings = bundle['normalized_ratings']
     normalized_popularity = bundle['normalized_popularity']
 
-    # Precompute cosine similarity on TF-IDF matrix
-    from sklearn.metrics.pairwise import cosine_similarity as _cos_sim
-    globals()['tag_similarities'] = _cos_sim(tfidf_matrix)
+    # Tag similarity rows are computed on demand from the sparse TF-IDF matrix
+    tag_similarities = TagSimilarity(tfidf_matrix)
 
 
 # Ensure the bundle is loaded before first use
@@ -56,6 +60,13 @@ def clean_text(text):
 if 'cleaned_tags' not in tv.columns:
     tv['cleaned_tags'] = tv['tags'].fillna('').apply(clean_text)
 
+# Normalised title -> row id, built once, with prefix/fuzzy search for misses
+title_index = TitleIndex(tv['title'])
+title_search = TitleSearch(title_index)
+
+# Catalog columns returned with each recommendation, read straight from the selected rows
+build_records = RecordBuilder(tv, ['title', 'genres'], score_decimals_from_env())
+
 # Genre weights and settings
 GENRE_SETTINGS = {
     'comedy': {'keywords': {'mockumentary', 'workplace', 'sitcom', 'funny'}, 'weight': 1.5, 'min_rating': 6.5},
@@ -66,37 +77,38 @@ GENRE_SETTINGS = {
     'default': {'keywords': set(), 'weight': 1.0, 'min_rating': 6.0}
 }
 
+# Genre sets encoded once for vectorised weighted-Jaccard similarity
+genre_index = GenreIndex(
+    tv['genres'],
+    weights={genre: setting['weight'] for genre, setting in GENRE_SETTINGS.items()},
+    default_weight=GENRE_SETTINGS['default']['weight'],
+)
+
+# Tag boost for each primary genre: 1.3 for rows whose cleaned tags mention one of its keywords
+_tag_sets = [set(tags.split()) for tags in tv['cleaned_tags']]
+CONTENT_BOOST = {
+    genre: np.array([1.3 if setting['keywords'] & tags else 1.0 for tags in _tag_sets])
+    for genre, setting in GENRE_SETTINGS.items()
+}
+del _tag_sets
+
 def recommend_tv_series(title, top_n=10, weights=(0.4, 0.3, 0.2, 0.1)):
     alpha, beta, gamma, delta = weights
 
-    title_lower = title.lower()
-    title_map = tv['title'].str.lower()
+    input_idx = title_index.lookup(title)
+    if input_idx is None:
+        input_idx = title_search.resolve(title)
 
-    if title_lower not in title_map.values:
+    if input_idx is None:
         return {"error": f"'{title}' not found in dataset."}
 
-    input_idx = title_map[title_map == title_lower].index[0]
-    input_genres = [g.lower() for g in tv.loc[input_idx, 'genres'].split()]
+    input_genres = [g.lower() for g in tv['genres'].iat[input_idx].split()]
     primary_genre = input_genres[0] if input_genres else 'default'
-    settings = GENRE_SETTINGS.get(primary_genre, GENRE_SETTINGS['default'])
-
-    def genre_similarity(other_genres):
-        g_set = set(other_genres.lower().split())
-        input_set = set(input_genres)
-        union = input_set | g_set
-        intersection = input_set & g_set
-        weighted_intersection = sum(GENRE_SETTINGS.get(g, GENRE_SETTINGS['default'])['weight'] for g in intersection)
-        weighted_union = sum(GENRE_SETTINGS.get(g, GENRE_SETTINGS['default'])['weight'] for g in union)
-        return weighted_intersection / weighted_union if weighted_union else 0
-
-    genre_sim = tv['genres'].apply(genre_similarity).values
+
+    genre_sim = genre_index.weighted_jaccard(input_idx)
     popularity_sim = normalized_popularity
-    input_tags = set(tv.loc[input_idx, 'cleaned_tags'].split())
 
-    content_boost = np.array([
-        1.3 if settings['keywords'] & set(tags.split()) else 1.0
-        for tags in tv['cleaned_tags']
-    ])
+    content_boost = CONTENT_BOOST.get(primary_genre, CONTENT_BOOST['default'])
 
     final_scores = (
         alpha * genre_sim +
@@ -105,11 +117,9 @@ def recommend_tv_series(title, top_n=10, weights=(0.4, 0.3, 0.2, 0.1)):
         delta * normalized_ratings
     )
 
-    tv['score'] = final_scores
-    recommendations = tv.sort_values(by='score', ascending=False)
-    recommendations = recommendations[recommendations.index != input_idx]
-
-    return recommendations[['title', 'genres', 'score']].head(top_n).reset_index(drop=True).to_dict(orient='records')
+    # Scores stay local to the request; the shared frame is never written to
+    rows = top_n_indices(final_scores, top_n, exclude=input_idx)
+    return build_records(rows, final_scores[rows])
 
 # Route: Fetch recommendations using URL like /recommend/Breaking%20Bad
 @app.route('/recommend/<string:title>', methods=['GET'])
@@ -1,57 +0,0 @@
-import pickle
-import sys
-import types
-
-# Minimal stub so pickle can load old bundles that reference sentence_transformers.model_card
-st_model_card_module = "sentence_transformers.model_card"
-if st_model_card_module not in sys.modules:
-    model_card_module = types.ModuleType(st_model_card_module)
-
-    class ModelCard:  # type: ignore
-        pass
-
-    class SentenceTransformerModelCardData:  # type: ignore
-        pass
-
-    def generate_model_card(*args, **kwargs):  # type: ignore
-        return None
-
-    model_card_module.ModelCard = ModelCard  # type: ignore[attr-defined]
-    model_card_module.SentenceTransformerModelCardData = SentenceTransformerModelCardData  # type: ignore[attr-defined]
-    model_card_module.generate_model_card = generate_model_card  # type: ignore[attr-defined]
-
-    sys.modules[st_model_card_module] = model_card_module
-
-# Stub legacy BERT attention class so pickle can resolve it
-bert_module_name = "transformers.models.bert.modeling_bert"
-try:
-    bert_module = __import__(bert_module_name, fromlist=["*"])
-    if not hasattr(bert_module, "BertSdpaSelfAttention"):
-        class BertSdpaSelfAttention:  # type: ignore
-            pass
-
-        setattr(bert_module, "BertSdpaSelfAttention", BertSdpaSelfAttention)
-except Exception:
-    # If this fails, we'll just let pickle raise a clearer error
-    pass
-
-SRC = "movie_recommender_bundle2_backup.pkl"
-DST = "movie_recommender_bundle2.pkl"  # overwrite original with lighter version
-
-with open(SRC, "rb") as f:
-    bundle = pickle.load(f)
-
-print("Original keys:", bundle.keys())
-
-# Remove heavy objects that aren't used in movie_recommend.py
-for key in ["model", "sentence_model", "tokenizer"]:
-    if key in bundle:
-        print(f"Removing key: {key}")
-        bundle.pop(key)
-
-print("Final keys:", bundle.keys())
-
-with open(DST, "wb") as f:
-    pickle.dump(bundle, f, protocol=4)
-
-print("Saved lightweight bundle to", DST)
\ No newline at end of file
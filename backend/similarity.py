@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+# Number of similarity rows each recommender keeps around for popular titles
+DEFAULT_CACHE_SIZE = 128
+
+
+class TagSimilarity:
+    """On-demand cosine similarity over a sparse TF-IDF matrix.
+
+    Indexing with ``sims[i]`` returns the same row as
+    ``cosine_similarity(tfidf_matrix)[i]``, but computes it with a single sparse
+    mat-vec instead of holding a dense N x N matrix in memory. Recently used rows
+    are kept in a small LRU cache when ``cache_size`` is positive.
+    """
+
+    def __init__(self, tfidf_matrix, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.matrix = _l2_normalized(sparse.csr_matrix(tfidf_matrix))
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        n = self.matrix.shape[0]
+        return (n, n)
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def __getitem__(self, idx) -> np.ndarray:
+        idx = int(idx)
+        if self.cache_size <= 0:
+            return self._compute_row(idx)
+
+        with self._lock:
+            row = self._cache.get(idx)
+            if row is not None:
+                self._cache.move_to_end(idx)
+                return row
+
+        row = self._compute_row(idx)
+        with self._lock:
+            self._cache[idx] = row
+            self._cache.move_to_end(idx)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return row
+
+    def subset(self, idx: int, rows) -> np.ndarray:
+        """``sims[idx][rows]``, computed from the TF-IDF rows of `rows` only."""
+        rows = np.asarray(rows, dtype=np.intp)
+        with self._lock:
+            cached = self._cache.get(int(idx))
+        if cached is not None:
+            return cached[rows]
+        query = self.matrix[int(idx)].toarray().ravel()
+        return np.asarray(self.matrix[rows] @ query).ravel()
+
+    def rows(self, idxs) -> np.ndarray:
+        """Similarity rows for several items as one (len(idxs), N) array.
+
+        Computed with a single sparse matrix product and not cached; meant for
+        batch scoring where the LRU would only churn.
+        """
+        queries = self.matrix[np.asarray(idxs, dtype=np.intp)].toarray()
+        return np.asarray(self.matrix @ queries.T).T
+
+    def profile(self, idxs, seed_weights) -> np.ndarray:
+        """Cosine similarity of every item to the weighted sum of several items' rows."""
+        query = np.asarray(seed_weights, dtype=np.float64) @ self.matrix[np.asarray(idxs, dtype=np.intp)].toarray()
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(self.matrix.shape[0], dtype=self.matrix.dtype)
+        return np.asarray(self.matrix @ (query / norm).astype(self.matrix.dtype, copy=False)).ravel()
+
+    def _compute_row(self, idx: int) -> np.ndarray:
+        query = self.matrix[idx].toarray().ravel()
+        row = np.asarray(self.matrix @ query).ravel()
+        # Rows may be shared through the cache, so never hand out a writable one
+        row.setflags(write=False)
+        return row
+
+    def astype(self, dtype) -> None:
+        """Store the matrix (and so compute similarity rows) in `dtype`, e.g. float32."""
+        self.matrix = self.matrix.astype(dtype)
+        self.clear_cache()
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+def _l2_normalized(matrix: sparse.csr_matrix, atol: float = 1e-6) -> sparse.csr_matrix:
+    """Return `matrix` with unit-length rows, copying only if it is not already normalised.
+
+    TF-IDF matrices produced by scikit-learn are L2-normalised by default, so in
+    the common case the bundle's matrix is used as-is. All-zero rows stay zero,
+    matching ``cosine_similarity``.
+    """
+    if matrix.dtype.kind != "f":
+        matrix = matrix.astype(np.float64)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    nonzero = norms > 0
+    if np.allclose(norms[nonzero], 1.0, atol=atol):
+        return matrix
+
+    scale = np.ones_like(norms)
+    scale[nonzero] = 1.0 / norms[nonzero]
+    return sparse.csr_matrix(sparse.diags(scale) @ matrix)
@@ -0,0 +1,43 @@
+"""Compact score precisions must rank like the float64 path (see compact.py)."""
+import sys
+
+import pytest
+
+import check_precision
+import model_loader
+from benchmark import SCHEMAS, synthetic_bundle
+
+CATALOG_SIZE = 2000
+SAMPLES = 200
+TOP_N = 10
+
+# Worst mean top-10 overlap accepted from 8-bit rating and popularity codes
+MIN_UINT8_OVERLAP = 0.95
+
+# int16 codes move scores by a few 1e-6: near-ties may swap, but the same items make the top-10
+MAX_INT16_SCORE_ERROR = 1e-4
+
+
+@pytest.fixture(params=sorted(SCHEMAS))
+def report(request, monkeypatch):
+    """check_precision's report for one domain's recommender loaded on a synthetic catalog."""
+    name = request.param
+    monkeypatch.delenv("SCORE_PRECISION", raising=False)
+    monkeypatch.setitem(model_loader._BUNDLES, name, synthetic_bundle(name, CATALOG_SIZE))
+    monkeypatch.setitem(model_loader._VERSIONS, name, "unbuilt")
+    # A fresh import of the module, on the synthetic bundle; the original is restored afterwards
+    monkeypatch.delitem(sys.modules, check_precision.DOMAIN_MODULES[name], raising=False)
+    return check_precision.check(name, ["float32", "int16", "uint8"], SAMPLES, TOP_N)
+
+
+def test_float32_reproduces_float64_rankings(report):
+    assert report["float32"]["same_order"] == 1.0
+
+
+def test_int16_keeps_float64_top_n(report):
+    assert report["int16"]["min_overlap"] == 1.0
+    assert report["int16"]["max_score_error"] < MAX_INT16_SCORE_ERROR
+
+
+def test_uint8_overlap_above_threshold(report):
+    assert report["uint8"]["overlap"] >= MIN_UINT8_OVERLAP
@@ -0,0 +1,107 @@
+"""FilterIndex bitmaps must select exactly the items a row-by-row check keeps."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from filters import NO_FILTERS, FilterIndex, Filters, parse_filters
+from genre_index import GenreIndex
+from title_index import TitleIndex, normalize_title
+
+N_ROWS = 3000
+N_FILTER_SETS = 1200
+GENRES = ["action", "comedy", "drama", "sci-fi", "fantasy", "horror", "romance", "thriller"]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    rng = np.random.default_rng(0)
+    genres = pd.Series([
+        " ".join(rng.choice(GENRES, size=rng.integers(0, 4), replace=False)).title() for _ in range(N_ROWS)
+    ], dtype=object)
+    genres[rng.random(N_ROWS) < 0.02] = np.nan
+
+    # Few distinct values, so floors often land exactly on items and bucket edges
+    ratings = pd.Series(rng.integers(10, 100, N_ROWS) / 10.0)
+    ratings[rng.random(N_ROWS) < 0.02] = np.nan
+    popularity = rng.integers(0, 200, N_ROWS) / 199.0
+    popularity[rng.random(N_ROWS) < 0.02] = np.nan
+
+    # Duplicated titles: excluding one drops every row that carries it
+    titles = pd.Series([f"Title {i}" for i in rng.integers(0, N_ROWS // 2, N_ROWS)])
+    row_min_rating = rng.choice([6.0, 6.5, 7.0], N_ROWS)
+
+    index = FilterIndex(GenreIndex(genres), ratings, popularity, TitleIndex(titles), row_min_rating=row_min_rating)
+    return {"genres": genres, "ratings": ratings.to_numpy(), "popularity": popularity, "titles": titles,
+            "row_min_rating": row_min_rating, "index": index,
+            "row_genres": [set(g.lower().split()) if isinstance(g, str) else set() for g in genres],
+            "row_titles": [normalize_title(t) for t in titles]}
+
+
+def brute_force_mask(catalog, filters):
+    """The items passing `filters`, checked item by item against the raw columns."""
+    row_genres, row_titles = catalog["row_genres"], catalog["row_titles"]
+    excluded = {normalize_title(t) for t in filters.exclude}
+    with np.errstate(invalid="ignore"):
+        mask = np.ones(N_ROWS, dtype=bool)
+        if filters.genres:
+            mask &= [bool(genres & filters.genres) for genres in row_genres]
+        mask &= [not genres & filters.exclude_genres for genres in row_genres]
+        if filters.min_rating is not None:
+            mask &= catalog["ratings"] >= filters.min_rating
+        if filters.min_popularity is not None:
+            mask &= catalog["popularity"] >= filters.min_popularity
+        if filters.genre_min_rating:
+            mask &= catalog["ratings"] >= catalog["row_min_rating"]
+        mask &= [title not in excluded for title in row_titles]
+    return mask
+
+
+def random_filters(rng, catalog):
+    def some(values, p):
+        return frozenset(v for v in values if rng.random() < p)
+
+    def floor(values):
+        if rng.random() < 0.5:
+            return None
+        # Either an existing value (ties on the floor) or anywhere in and around the range
+        finite = values[~np.isnan(values)]
+        return float(rng.choice(finite)) if rng.random() < 0.5 else float(rng.uniform(finite.min() - 1, finite.max() + 1))
+
+    return Filters(
+        genres=some(GENRES + ["western"], 0.15),
+        exclude_genres=some(GENRES, 0.1),
+        min_rating=floor(catalog["ratings"]),
+        min_popularity=floor(catalog["popularity"]),
+        exclude=tuple(catalog["titles"].sample(int(rng.integers(0, 5)), random_state=int(rng.integers(1 << 31)))),
+        genre_min_rating=bool(rng.random() < 0.3),
+    )
+
+
+def test_masks_match_brute_force(catalog):
+    rng = np.random.default_rng(1)
+    for _ in range(N_FILTER_SETS):
+        filters = random_filters(rng, catalog)
+        expected = brute_force_mask(catalog, filters)
+        mask = catalog["index"].mask(filters)
+        if mask is None:
+            assert expected.all(), filters
+        else:
+            np.testing.assert_array_equal(mask, expected, err_msg=repr(filters))
+
+
+def test_no_filters_keep_every_item(catalog):
+    assert catalog["index"].mask(NO_FILTERS) is None
+    assert catalog["index"].mask(parse_filters({})) is None
+
+
+def test_excluded_titles_match_normalised(catalog):
+    title = catalog["titles"].iat[0]
+    mask = catalog["index"].mask(Filters(exclude=(f"  {title.upper()} ",)))
+    np.testing.assert_array_equal(~mask, catalog["titles"].map(normalize_title) == normalize_title(title))
+
+
+def test_genre_min_rating_needs_row_floors(catalog):
+    index = FilterIndex(GenreIndex(catalog["genres"]), pd.Series(catalog["ratings"]), catalog["popularity"],
+                        TitleIndex(catalog["titles"]))
+    with pytest.raises(ValueError):
+        index.mask(Filters(genre_min_rating=True))
@@ -0,0 +1,78 @@
+"""GenreIndex must score exactly like the per-row closures it replaced."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from genre_index import GenreIndex
+
+GENRES = pd.Series([
+    "Action Comedy", "comedy action", "Drama", "", np.nan, "Sci-Fi Drama Action",
+    "drama drama", "Horror", None, "Action", "romance COMEDY drama", "sci-fi",
+])
+
+WEIGHTS = {"comedy": 1.5, "drama": 1.3, "sci-fi": 1.4, "action": 1.2}
+
+
+def closure_jaccard(genres, input_idx):
+    """The movie/anime/manga ``genre_jaccard`` closure, error paths included."""
+    try:
+        input_genres = set(genres.iat[input_idx].lower().split())
+    except Exception:
+        input_genres = set()
+
+    def genre_jaccard(g):
+        try:
+            g_set = set(g.lower().split())
+            union = input_genres | g_set
+            if not union:
+                return 0
+            return len(input_genres & g_set) / len(union)
+        except:
+            return 0
+
+    return genres.apply(genre_jaccard).values.astype(np.float64)
+
+
+def closure_weighted_jaccard(genres, input_idx):
+    """The TV series ``genre_similarity`` closure with GENRE_SETTINGS-style weights."""
+    input_genres = [g.lower() for g in genres.iat[input_idx].split()]
+
+    def genre_similarity(other_genres):
+        g_set = set(other_genres.lower().split())
+        input_set = set(input_genres)
+        union = input_set | g_set
+        intersection = input_set & g_set
+        weighted_intersection = sum(WEIGHTS.get(g, 1.0) for g in intersection)
+        weighted_union = sum(WEIGHTS.get(g, 1.0) for g in union)
+        return weighted_intersection / weighted_union if weighted_union else 0
+
+    return genres.apply(genre_similarity).values.astype(np.float64)
+
+
+@pytest.mark.parametrize("idx", range(len(GENRES)))
+def test_jaccard_matches_closure(idx):
+    index = GenreIndex(GENRES)
+    np.testing.assert_array_equal(index.jaccard(idx), closure_jaccard(GENRES, idx))
+
+
+def test_weighted_jaccard_matches_closure():
+    genres = GENRES.fillna("")
+    index = GenreIndex(genres, weights=WEIGHTS)
+    for idx in range(len(genres)):
+        # Summation order may differ in the last ulp
+        np.testing.assert_allclose(index.weighted_jaccard(idx), closure_weighted_jaccard(genres, idx),
+                                   rtol=1e-12, atol=0)
+
+
+def test_batch_variants_match_single_rows():
+    index = GenreIndex(GENRES.fillna(""), weights=WEIGHTS)
+    idxs = np.arange(len(GENRES))
+    np.testing.assert_array_equal(index.jaccard_many(idxs), np.stack([index.jaccard(i) for i in idxs]))
+    np.testing.assert_allclose(index.weighted_jaccard_many(idxs),
+                               np.stack([index.weighted_jaccard(i) for i in idxs]), rtol=1e-12)
+
+
+def test_rows_subset_matches_full_row():
+    index = GenreIndex(GENRES)
+    rows = np.array([5, 0, 9, 4])
+    np.testing.assert_array_equal(index.jaccard(0, rows), index.jaccard(0)[rows])
@@ -0,0 +1,90 @@
+import unicodedata
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_title(title: str) -> str:
+    """Canonical lookup key for a title.
+
+    Unicode-normalises (NFKC), casefolds and collapses runs of whitespace, so
+    "Pokémon", "POKÉMON " and the decomposed "Pokémon" all map to the
+    same key.
+    """
+    return " ".join(unicodedata.normalize("NFKC", title).casefold().split())
+
+
+class TitleIndex:
+    """Hash index from normalised title to catalog row ids, built once at load.
+
+    When several rows share a normalised title the lowest row id wins, which
+    is what the old ``title_map[title_map == title].index[0]`` lookup did; all
+    of them remain available through ``rows``. Non-string titles (NaN) are not
+    indexed.
+    """
+
+    def __init__(self, titles: Iterable):
+        self._index_keys(normalize_title(title) if isinstance(title, str) else None for title in titles)
+
+    def _index_keys(self, row_keys: Iterable[Optional[str]]) -> None:
+        first: Dict[str, int] = {}
+        duplicates: Dict[str, List[int]] = {}
+
+        for i, key in enumerate(row_keys):
+            if key is None:
+                continue
+            if key in first:
+                duplicates.setdefault(key, [first[key]]).append(i)
+            else:
+                first[key] = i
+
+        self._first = first
+        self._duplicates = {key: tuple(ids) for key, ids in duplicates.items()}
+
+    def to_bundle(self, n_rows: int) -> Dict[str, Any]:
+        """The normalised keys as bundle entries, for build_bundle.py.
+
+        Stores each distinct key once plus, per catalog row, the id of its key
+        (-1 for unindexed rows), so loading needs no Unicode normalisation.
+        """
+        keys = list(self._first)
+        key_ids = {key: i for i, key in enumerate(keys)}
+        row_keys = np.full(n_rows, -1, dtype=np.int32)
+        for key, idx in self._first.items():
+            row_keys[idx] = key_ids[key]
+        for key, ids in self._duplicates.items():
+            row_keys[list(ids)] = key_ids[key]
+        return {"title_index.keys": keys, "title_index.row_keys": row_keys}
+
+    @classmethod
+    def from_bundle(cls, bundle: Mapping[str, Any], titles: Iterable) -> "TitleIndex":
+        """The index stored in a built bundle, or one built from `titles` if it has none."""
+        if "title_index.keys" not in bundle:
+            return cls(titles)
+
+        index = cls.__new__(cls)
+        keys = bundle["title_index.keys"]
+        index._index_keys(keys[k] if k >= 0 else None for k in bundle["title_index.row_keys"].tolist())
+        return index
+
+    def __len__(self) -> int:
+        return len(self._first)
+
+    def __contains__(self, title: str) -> bool:
+        return normalize_title(title) in self._first
+
+    def items(self) -> Iterable[Tuple[str, int]]:
+        """(normalised key, row id) pairs, one per distinct title."""
+        return self._first.items()
+
+    def lookup(self, title: str) -> Optional[int]:
+        """Row id for `title`, or None if no catalog title normalises to the same key."""
+        return self._first.get(normalize_title(title))
+
+    def rows(self, title: str) -> Tuple[int, ...]:
+        """All row ids sharing `title`'s normalised key, in catalog order."""
+        key = normalize_title(title)
+        if key in self._duplicates:
+            return self._duplicates[key]
+        idx = self._first.get(key)
+        return () if idx is None else (idx,)
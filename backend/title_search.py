@@ -0,0 +1,163 @@
+from bisect import bisect_left
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from title_index import TitleIndex, normalize_title
+
+# Fuzzy matches below this trigram similarity are not used to answer a recommendation
+MIN_RESOLVE_SIMILARITY = 0.5
+
+# Fuzzy matches below this trigram similarity are not offered as suggestions
+MIN_SUGGEST_SIMILARITY = 0.3
+
+# Shorter queries only resolve to a title on an exact match
+MIN_RESOLVE_LENGTH = 3
+
+# Sorts after any character of a normalised title: query + _RUN_END bounds a prefix run
+_RUN_END = "\U0010ffff"
+
+
+def _trigrams(key: str) -> set:
+    """Word-padded character trigrams of a normalised title, as in pg_trgm."""
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TitleSearch:
+    """Prefix and fuzzy title resolution over a catalog's normalised titles.
+
+    Keys come from a ``TitleIndex``, so duplicates collapse to the same row the
+    exact lookup would return. Prefix queries binary-search a sorted key list;
+    fuzzy queries count shared trigrams through an inverted index and only
+    touch titles that share at least one trigram with the query.
+    """
+
+    def __init__(self, title_index: TitleIndex):
+        entries = sorted(title_index.items())
+        keys = [key for key, _ in entries]
+        self.keys = keys
+        self.key_rows = np.array([row for _, row in entries], dtype=np.int64)
+        self.key_lengths = np.array([len(key) for key in keys], dtype=np.int32)
+
+        postings: Dict[str, List[int]] = {}
+        sizes = np.empty(len(keys), dtype=np.int32)
+        for key_id, key in enumerate(keys):
+            grams = _trigrams(key)
+            sizes[key_id] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(key_id)
+
+        self.trigram_sizes = sizes
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def to_bundle(self) -> Dict[str, Any]:
+        """The trigram index as bundle entries, for build_bundle.py.
+
+        Keys are not stored again: they are the title index's keys in sorted
+        order. Postings are concatenated with offsets, CSR style.
+        """
+        grams = sorted(self.postings)
+        lengths = [len(self.postings[gram]) for gram in grams]
+        offsets = np.zeros(len(grams) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        ids = np.concatenate([self.postings[gram] for gram in grams]) if grams else np.empty(0, dtype=np.int32)
+        return {
+            "title_search.trigram_sizes": self.trigram_sizes,
+            "title_search.grams": grams,
+            "title_search.posting_offsets": offsets,
+            "title_search.posting_ids": ids,
+        }
+
+    @classmethod
+    def from_bundle(cls, bundle: Mapping[str, Any], title_index: TitleIndex) -> "TitleSearch":
+        """The search index stored in a built bundle, or one built from `title_index` if it has none."""
+        if "title_search.grams" not in bundle:
+            return cls(title_index)
+
+        search = cls.__new__(cls)
+        entries = sorted(title_index.items())
+        search.keys = [key for key, _ in entries]
+        search.key_rows = np.array([row for _, row in entries], dtype=np.int64)
+        search.key_lengths = np.array([len(key) for key in search.keys], dtype=np.int32)
+        search.trigram_sizes = bundle["title_search.trigram_sizes"]
+
+        offsets = bundle["title_search.posting_offsets"].tolist()
+        ids = bundle["title_search.posting_ids"]
+        search.postings = {
+            gram: ids[offsets[i]:offsets[i + 1]] for i, gram in enumerate(bundle["title_search.grams"])
+        }
+        return search
+
+    def prefix(self, query: str, limit: int = 10) -> List[int]:
+        """Key ids of titles starting with `query`, shortest titles first."""
+        query = normalize_title(query)
+        if not query:
+            return []
+
+        # The whole alphabetical run of keys starting with the query, shortest first;
+        # the stable sort keeps equally long keys in alphabetical order
+        start = bisect_left(self.keys, query)
+        end = bisect_left(self.keys, query + _RUN_END, lo=start)
+        order = np.argsort(self.key_lengths[start:end], kind="stable")[:max(limit, 0)]
+        return (order + start).tolist()
+
+    def fuzzy(self, query: str, limit: int = 10,
+              min_similarity: float = MIN_SUGGEST_SIMILARITY) -> List[Tuple[int, float]]:
+        """(key id, trigram Jaccard similarity) of the titles closest to `query`, best first."""
+        query_grams = _trigrams(normalize_title(query))
+        grams = [g for g in query_grams if g in self.postings]
+        if not grams or limit <= 0:
+            return []
+
+        counts = np.bincount(np.concatenate([self.postings[g] for g in grams]), minlength=len(self.keys))
+        candidates = np.flatnonzero(counts)
+        shared = counts[candidates]
+        similarity = shared / (len(query_grams) + self.trigram_sizes[candidates] - shared)
+
+        keep = similarity >= min_similarity
+        candidates, similarity = candidates[keep], similarity[keep]
+        if len(candidates) > limit:
+            best = np.argpartition(-similarity, limit - 1)[:limit]
+            candidates, similarity = candidates[best], similarity[best]
+
+        order = np.lexsort((candidates, -similarity))
+        return [(int(candidates[i]), float(similarity[i])) for i in order]
+
+    def resolve(self, query: str) -> Optional[int]:
+        """Best catalog row for a title that missed the exact index, or None.
+
+        A prefix hit wins first (the shortest title that starts with the query),
+        then the closest fuzzy match if it is similar enough. Queries shorter
+        than MIN_RESOLVE_LENGTH characters are too ambiguous for either.
+        """
+        if len(normalize_title(query)) < MIN_RESOLVE_LENGTH:
+            return None
+
+        prefixed = self.prefix(query, limit=1)
+        if prefixed:
+            return int(self.key_rows[prefixed[0]])
+
+        fuzzy = self.fuzzy(query, limit=1, min_similarity=MIN_RESOLVE_SIMILARITY)
+        if fuzzy:
+            return int(self.key_rows[fuzzy[0][0]])
+        return None
+
+    def suggest(self, query: str, limit: int = 10) -> List[Tuple[int, float]]:
+        """(row id, score) suggestions for autocomplete: prefix hits first, then fuzzy ones.
+
+        Prefix hits score 1.0; fuzzy hits carry their trigram similarity.
+        """
+        results = [(key_id, 1.0) for key_id in self.prefix(query, limit)]
+        seen = {key_id for key_id, _ in results}
+        if len(results) < limit:
+            for key_id, similarity in self.fuzzy(query, limit + len(results)):
+                if key_id not in seen:
+                    results.append((key_id, similarity))
+                    seen.add(key_id)
+                if len(results) >= limit:
+                    break
+        return [(int(self.key_rows[key_id]), score) for key_id, score in results]
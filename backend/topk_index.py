@@ -0,0 +1,105 @@
+import json
+import os
+from typing import Callable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Precomputed neighbour tables live next to the model bundles
+INDEX_DIR = os.path.dirname(__file__)
+
+
+def _paths(name: str, index_dir: str = INDEX_DIR) -> Tuple[str, str, str]:
+    base = os.path.join(index_dir, f"{name}_topk")
+    return f"{base}_neighbors.npy", f"{base}_scores.npy", f"{base}_meta.json"
+
+
+class TopKIndex:
+    """Memory-mapped table of each item's top-K neighbours under the default weights.
+
+    Row ``i`` of ``neighbors`` holds the positional ids of item ``i``'s best K
+    recommendations (the item itself excluded) in ranked order, and the same row
+    of ``scores`` holds their final scores.
+    """
+
+    def __init__(self, neighbors: np.ndarray, scores: np.ndarray, weights: Sequence[float]):
+        self.neighbors = neighbors
+        self.scores = scores
+        self.weights = tuple(float(w) for w in weights)
+        self.k = neighbors.shape[1]
+
+    def covers(self, top_n: int, weights: Sequence[float]) -> bool:
+        """True if a request for `top_n` items with `weights` can be answered from the table."""
+        return top_n <= self.k and tuple(float(w) for w in weights) == self.weights
+
+    def neighbours(self, idx: int, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.neighbors[idx, :top_n], self.scores[idx, :top_n]
+
+
+def load_topk_index(name: str, n_items: int, weights: Sequence[float], version: Optional[str] = None,
+                    index_dir: str = INDEX_DIR) -> Optional[TopKIndex]:
+    """Open the neighbour table for `name` if one was built for this catalog.
+
+    Returns None when no table exists or it was built for a different catalog
+    size, weight vector or, if `version` is given, bundle version (see
+    model_loader.bundle_version), in which case callers fall back to live
+    scoring.
+    """
+    neighbors_path, scores_path, meta_path = _paths(name, index_dir)
+    if not all(os.path.exists(p) for p in (neighbors_path, scores_path, meta_path)):
+        return None
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    if meta.get("n_items") != n_items:
+        return None
+    if version is not None and meta.get("version") != version:
+        return None
+    if tuple(float(w) for w in meta.get("weights", ())) != tuple(float(w) for w in weights):
+        return None
+
+    neighbors = np.load(neighbors_path, mmap_mode="r")
+    scores = np.load(scores_path, mmap_mode="r")
+    if neighbors.shape[0] != n_items or neighbors.shape != scores.shape:
+        return None
+    return TopKIndex(neighbors, scores, meta["weights"])
+
+
+def build_topk_index(name: str, score_fn: Callable[[int], np.ndarray], n_items: int,
+                     k: int, weights: Sequence[float], version: Optional[str] = None,
+                     index_dir: str = INDEX_DIR) -> str:
+    """Score every item with `score_fn` and write its top-`k` neighbours to disk.
+
+    `version` is the version of the bundle the scores come from; the table
+    is only served with that bundle. Arrays are written through temporary
+    files and renamed into place so a serving process never maps a
+    half-written table.
+    """
+    k = min(k, n_items - 1)
+    neighbors_path, scores_path, meta_path = _paths(name, index_dir)
+    tmp_neighbors = neighbors_path + ".tmp"
+    tmp_scores = scores_path + ".tmp"
+
+    neighbors = np.lib.format.open_memmap(tmp_neighbors, mode="w+", dtype=np.int32, shape=(n_items, k))
+    scores = np.lib.format.open_memmap(tmp_scores, mode="w+", dtype=np.float32, shape=(n_items, k))
+
+    for idx in range(n_items):
+        row = np.array(score_fn(idx), dtype=np.float64)
+        row[idx] = -np.inf
+        candidates = np.argpartition(-row, k - 1)[:k]
+        # Highest score first, lower id first on ties so rebuilds are reproducible
+        order = np.lexsort((candidates, -row[candidates]))
+        best = candidates[order]
+        neighbors[idx] = best
+        scores[idx] = row[best]
+
+    neighbors.flush()
+    scores.flush()
+    del neighbors, scores
+
+    os.replace(tmp_neighbors, neighbors_path)
+    os.replace(tmp_scores, scores_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"n_items": n_items, "k": k, "weights": [float(w) for w in weights], "version": version}, f)
+
+    return neighbors_path
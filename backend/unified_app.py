@@ -1,20 +1,68 @@
-from flask import Flask, request, jsonify
+import math
+import os
+import time
+
+from flask import Flask, g, request, jsonify
 from flask_cors import CORS
 
-from movie_recommend import recommend_movies_advanced
-#from manga_recommend import recommend_manga_advanced
-#from animeapp import recommend_anime_advanced
-#from seriesapp import recommend_tv_series
+import domains
+import metrics
+import prefork
+from domains import DOMAINS, get_function, load_domain
+from filters import FILTER_PARAMS, filters_from_args, parse_filters
+from pagination import MAX_PAGE_SIZE, StaleCursor
+from result_cache import etag
+from serialise import JSONProvider
 
 app = Flask(__name__)
+app.json = JSONProvider(app)
 CORS(app)
 
+# Domains are loaded on first request unless listed in PRELOAD_DOMAINS
+domains.preload()
+
+# Send every response's stage breakdown as a Server-Timing header, not only
+# for requests that ask for it with an X-Debug-Timings header
+DEBUG_TIMINGS = os.environ.get("DEBUG_TIMINGS", "").strip().lower() in ("1", "true", "yes")
+
+
+@app.before_request
+def _start_timing():
+    g.request_start = time.perf_counter()
+    metrics.start_request()
+
+
+@app.after_request
+def _finish_timing(response):
+    timings = metrics.finish_request()
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                    endpoint=request.endpoint or "unknown", status=response.status_code)
+    if timings and (DEBUG_TIMINGS or "X-Debug-Timings" in request.headers):
+        response.headers["Server-Timing"] = metrics.server_timing(timings)
+    return response
+
+
+def _serialise(domain, payload):
+    """``jsonify(payload)``, timed as the serialise stage of `domain`."""
+    with metrics.stage(DOMAINS[domain].bundle, "serialise"):
+        return jsonify(payload)
+
 
 @app.route("/")
 def home():
     return (
         "Unified Recommendation API is running. "
         "Use /movies/recommend/, /manga/recommend/, /anime/recommend/<title>, /series/recommend/<title>. "
+        "Title autocomplete: /<domain>/suggest?q=partial. "
+        "Free-text search: /<domain>/search?q=description. "
+        "Batch: POST /<domain>/recommend/batch with {\"titles\": [...]}. "
+        "Profile: POST /<domain>/recommend/profile with {\"titles\": [...], \"seed_weights\": [...]}. "
+        "Filters: genres, exclude_genres, min_rating, min_popularity (0 to 1), exclude (repeatable) and, for series, "
+        "genre_min_rating as query parameters, or a \"filters\" object in POST bodies. "
+        "Cross-domain: /cross/recommend?from=movies&title=Inception&to=anime,manga. "
+        "Paged: /<domain>/recommendations?title=Inception&limit=20, then ?cursor=<next_cursor>. "
+        "Domains: movies, anime, manga, series. "
+        "Worker memory: /debug/memory, result cache: /debug/cache, Prometheus metrics: /metrics. "
         "Legacy movie endpoint: /recommend/?title=MovieTitle"
     )
 
@@ -34,12 +82,7 @@ def recommend_movies():
             400,
         )
 
-    recommendations = recommend_movies_advanced(title)
-
-    if isinstance(recommendations, dict) and "error" in recommendations:
-        return jsonify(recommendations), 404
-
-    return jsonify(recommendations)
+    return _recommend("movies", title)
 
 
 # Legacy route for movies to keep existing frontend paths working
@@ -48,50 +91,355 @@ def recommend_movies_legacy():
     return recommend_movies()
 
 
-# @app.route("/manga/recommend/", methods=["GET"])
-# def recommend_manga():
-#     title = request.args.get("title", default=None, type=str)
-#
-#     if not title:
-#         return (
-#             jsonify(
-#                 {
-#                     "error": "Please provide a manga title via the 'title' query parameter.",
-#                     "example": "/manga/recommend/?title=Naruto",
-#                 }
-#             ),
-#             400,
-#         )
-#
-#     recommendations = recommend_manga_advanced(title)
-#
-#     if isinstance(recommendations, dict) and "error" in recommendations:
-#         return jsonify(recommendations), 404
-#
-#     return jsonify(recommendations)
-
-
-# @app.route("/anime/recommend/<string:title>", methods=["GET"])
-# def recommend_anime(title):
-#     result = recommend_anime_advanced(title)
-#
-#     if isinstance(result, dict) and "error" in result:
-#         return jsonify(result), 404
-#
-#     return jsonify(result)
-
-
-# @app.route("/series/recommend/<string:title>", methods=["GET"])
-# def recommend_series(title):
-#     result = recommend_tv_series(title)
-#
-#     if isinstance(result, dict) and "error" in result:
-#         return jsonify(result), 404
-#
-#     return jsonify(result)
+@app.route("/manga/recommend/", methods=["GET"])
+def recommend_manga():
+    title = request.args.get("title", default=None, type=str)
+
+    if not title:
+        return (
+            jsonify(
+                {
+                    "error": "Please provide a manga title via the 'title' query parameter.",
+                    "example": "/manga/recommend/?title=Naruto",
+                }
+            ),
+            400,
+        )
+
+    return _recommend("manga", title)
+
+
+@app.route("/anime/recommend/<string:title>", methods=["GET"])
+def recommend_anime(title):
+    return _recommend("anime", title)
+
+
+@app.route("/series/recommend/<string:title>", methods=["GET"])
+def recommend_series(title):
+    return _recommend("series", title)
+
+
+def _filters(domain, filters):
+    """Request `filters` (see filters.py), checked against `domain`'s catalog; raises ValueError."""
+    return load_domain(domain).filter_index.validate(filters)
+
+
+def _invalid_filters(exc):
+    return jsonify({"error": f"Invalid filters: {exc}", "filters": list(FILTER_PARAMS)}), 400
+
+
+def _recommend(domain, title):
+    try:
+        filters = _filters(domain, filters_from_args(request.args))
+    except ValueError as exc:
+        return _invalid_filters(exc)
+
+    # Results only change with the bundle, so clients and CDNs may reuse them
+    tag = etag(domains.recommend_key(domain, title, filters=filters))
+    if tag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        result = domains.recommend(domain, title, filters=filters)
+        if isinstance(result, dict) and "error" in result:
+            return jsonify(result), 404
+        response = _serialise(domain, result)
+
+    response.set_etag(tag)
+    response.headers["Cache-Control"] = f"public, max-age={int(domains.result_cache.ttl)}"
+    return response
+
+
+def _unknown_domain(domain):
+    return jsonify({"error": f"Unknown domain '{domain}'.", "domains": list(DOMAINS)}), 404
+
+
+# Paged recommendations: the first page by title (and filters), later ones by the cursor each page returns
+@app.route("/<string:domain>/recommendations", methods=["GET"])
+def recommend_page(domain):
+    if domain not in DOMAINS:
+        return _unknown_domain(domain)
+
+    title = request.args.get("title", default="", type=str).strip()
+    cursor = request.args.get("cursor", default="", type=str).strip()
+    limit = request.args.get("limit", default=None, type=str)
+
+    if not title and not cursor:
+        return (
+            jsonify(
+                {
+                    "error": "Please provide a title via the 'title' query parameter, "
+                             "or the 'next_cursor' of the previous page via 'cursor'.",
+                    "example": f"/{domain}/recommendations?title=Inception&limit=20",
+                }
+            ),
+            400,
+        )
+
+    try:
+        filters = _filters(domain, filters_from_args(request.args))
+    except ValueError as exc:
+        return _invalid_filters(exc)
+
+    if limit is not None:
+        limit = int(limit) if limit.strip().isdigit() else 0
+        if limit < 1:
+            return jsonify({"error": "'limit' must be a positive integer."}), 400
+        limit = min(limit, MAX_PAGE_SIZE)
+
+    try:
+        page = domains.recommend_page(domain, title, limit, filters, cursor or None)
+    except StaleCursor as exc:
+        return jsonify({"error": str(exc)}), 410
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    if "error" in page:
+        return jsonify(page), 404
+
+    return _serialise(domain, page)
+
+
+MAX_SUGGESTIONS = 50
+
+
+# Title autocomplete per domain, answered from the catalog's own spelling
+@app.route("/<string:domain>/suggest", methods=["GET"])
+def suggest_titles(domain):
+    if domain not in DOMAINS:
+        return _unknown_domain(domain)
+
+    query = request.args.get("q", default="", type=str).strip()
+    limit = request.args.get("limit", default=10, type=int)
+
+    if not query:
+        return (
+            jsonify(
+                {
+                    "error": "Please provide a partial title via the 'q' query parameter.",
+                    "example": f"/{domain}/suggest?q=incep",
+                }
+            ),
+            400,
+        )
+
+    return jsonify(load_domain(domain).suggest_titles(query, max(1, min(limit, MAX_SUGGESTIONS))))
+
+
+MAX_SEARCH_RESULTS = 100
+
+
+# Recommendations for a free-text description, e.g. /movies/search?q=dark+sci-fi+time+travel
+@app.route("/<string:domain>/search", methods=["GET"])
+def search(domain):
+    if domain not in DOMAINS:
+        return _unknown_domain(domain)
+
+    query = request.args.get("q", default="", type=str).strip()
+    limit = request.args.get("limit", default=10, type=int)
+
+    if not query:
+        return (
+            jsonify(
+                {
+                    "error": "Please describe what you are looking for via the 'q' query parameter.",
+                    "example": f"/{domain}/search?q=dark sci-fi with time travel",
+                }
+            ),
+            400,
+        )
+
+    try:
+        filters = _filters(domain, filters_from_args(request.args))
+    except ValueError as exc:
+        return _invalid_filters(exc)
+
+    results = get_function(domain, "search")(query, top_n=max(1, min(limit, MAX_SEARCH_RESULTS)), filters=filters)
+    return _serialise(domain, results)
+
+
+MAX_CROSS_RESULTS = 100
+
+
+# Recommendations in other domains, e.g. /cross/recommend?from=movies&title=Inception&to=anime,manga
+@app.route("/cross/recommend", methods=["GET"])
+def recommend_cross():
+    source = request.args.get("from", default="", type=str).strip()
+    title = request.args.get("title", default="", type=str).strip()
+    to = request.args.get("to", default="", type=str)
+    limit = request.args.get("limit", default=10, type=int)
+
+    if not source or not title:
+        return (
+            jsonify(
+                {
+                    "error": "Please provide the title's domain via 'from' and the title via 'title'; "
+                             "'to' lists the domains to recommend from (default: all others).",
+                    "example": "/cross/recommend?from=movies&title=Inception&to=anime,manga",
+                }
+            ),
+            400,
+        )
+
+    targets = [target.strip() for target in to.split(",") if target.strip()] or [d for d in DOMAINS if d != source]
+    for domain in [source, *targets]:
+        if domain not in DOMAINS:
+            return _unknown_domain(domain)
+
+    try:
+        result = domains.recommend_cross(source, title, targets, top_n=max(1, min(limit, MAX_CROSS_RESULTS)))
+    except LookupError as exc:
+        return jsonify({"error": str(exc)}), 503
+
+    if "error" in result:
+        return jsonify(result), 404
+
+    with metrics.stage("cross", "serialise"):
+        return jsonify({"from": source, "title": title, "recommendations": result})
+
+
+MAX_BATCH_TITLES = 1000
+
+
+# Many-title recommendation per domain, scored as one matrix operation
+@app.route("/<string:domain>/recommend/batch", methods=["POST"])
+def recommend_batch(domain):
+    if domain not in DOMAINS:
+        return _unknown_domain(domain)
+
+    payload = request.get_json(silent=True) or {}
+    titles = payload.get("titles")
+    top_n = payload.get("top_n", 10)
+
+    if (
+        not isinstance(titles, list)
+        or not titles
+        or not all(isinstance(t, str) and t for t in titles)
+        or not isinstance(top_n, int) or isinstance(top_n, bool)
+        or top_n < 1
+    ):
+        return (
+            jsonify(
+                {
+                    "error": "Please POST a JSON body with a non-empty 'titles' list and an optional positive 'top_n'.",
+                    "example": {"titles": ["Inception", "Interstellar"], "top_n": 10},
+                }
+            ),
+            400,
+        )
+
+    if len(titles) > MAX_BATCH_TITLES:
+        return jsonify({"error": f"At most {MAX_BATCH_TITLES} titles per batch request."}), 400
+
+    try:
+        filters = _filters(domain, parse_filters(payload.get("filters")))
+    except ValueError as exc:
+        return _invalid_filters(exc)
+
+    results = get_function(domain, "batch")(titles, top_n=top_n, filters=filters)
+
+    return _serialise(
+        domain,
+        [
+            {"title": title, **result} if isinstance(result, dict) else {"title": title, "recommendations": result}
+            for title, result in zip(titles, results)
+        ],
+    )
+
+
+def _positive_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value) and value > 0
+
+
+# Recommendations from several liked titles at once, per domain
+@app.route("/<string:domain>/recommend/profile", methods=["POST"])
+def recommend_profile(domain):
+    if domain not in DOMAINS:
+        return _unknown_domain(domain)
+
+    payload = request.get_json(silent=True) or {}
+    titles = payload.get("titles")
+    seed_weights = payload.get("seed_weights")
+    top_n = payload.get("top_n", 10)
+
+    if (
+        not isinstance(titles, list)
+        or not titles
+        or not all(isinstance(t, str) and t for t in titles)
+        or not isinstance(top_n, int) or isinstance(top_n, bool)
+        or top_n < 1
+        or len(titles) > MAX_BATCH_TITLES
+    ):
+        return (
+            jsonify(
+                {
+                    "error": "Please POST a JSON body with a non-empty 'titles' list, optional 'seed_weights' and 'top_n'.",
+                    "example": {"titles": ["Inception", "Interstellar"], "seed_weights": [2, 1], "top_n": 10},
+                }
+            ),
+            400,
+        )
+
+    try:
+        filters = _filters(domain, parse_filters(payload.get("filters")))
+    except ValueError as exc:
+        return _invalid_filters(exc)
+
+    if seed_weights is not None and (
+        not isinstance(seed_weights, list)
+        or len(seed_weights) != len(titles)
+        or not all(_positive_number(w) for w in seed_weights)
+    ):
+        return jsonify({"error": "'seed_weights' must be a list of positive numbers, one per title."}), 400
+
+    recommendations = get_function(domain, "profile")(titles, seed_weights=seed_weights, top_n=top_n,
+                                                      filters=filters)
+
+    if isinstance(recommendations, dict) and "error" in recommendations:
+        return jsonify(recommendations), 404
+
+    return _serialise(domain, recommendations)
+
+
+# Hit/miss counters of the worker's result cache
+@app.route("/debug/cache", methods=["GET"])
+def debug_cache():
+    return jsonify(domains.result_cache.stats())
+
+
+def _result_cache_metrics():
+    stats = domains.result_cache.stats()
+    yield "# HELP unirex_result_cache_events_total Result cache lookups and removals by outcome."
+    yield "# TYPE unirex_result_cache_events_total counter"
+    for event in ("hits", "shared_hits", "misses", "evictions", "expirations", "shared_errors"):
+        yield f'unirex_result_cache_events_total{{event="{event}"}} {stats[event]}'
+    yield "# HELP unirex_result_cache_entries Entries in the worker's result cache."
+    yield "# TYPE unirex_result_cache_entries gauge"
+    yield f"unirex_result_cache_entries {stats['entries']}"
+
+
+metrics.register_collector(_result_cache_metrics)
+
+
+# Stage, request and load latencies of this worker in Prometheus text format
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# Shared vs private memory of the worker answering, to check pre-fork sharing
+@app.route("/debug/memory", methods=["GET"])
+def debug_memory():
+    return jsonify({**prefork.memory_report(), "loaded": [name for name in DOMAINS if domains.is_loaded(name)]})
+
+
+def create_prefork_app():
+    """The app with every domain loaded and frozen, for pre-fork servers (see gunicorn.conf.py)."""
+    domains.preload(DOMAINS)
+    domains.cross_index()
+    prefork.freeze(load_domain(name) for name in DOMAINS)
+    return app
 
 
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", 5000))
     app.run(debug=False, host="0.0.0.0", port=port)
@@ -46,17 +46,16 @@ function AnimeRecommend() {
     const controller = new AbortController();
     const timeoutId = window.setTimeout(async () => {
       try {
+        // Suggest titles spelled exactly as in the recommendation dataset
         const response = await fetch(
-          `https://api.jikan.moe/v4/anime?q=${encodeURIComponent(query)}&limit=8`,
+          `http://localhost:5000/anime/suggest?q=${encodeURIComponent(query)}&limit=8`,
           { signal: controller.signal }
         );
 
         const data = await response.json();
 
-        if (data && Array.isArray(data.data)) {
-          const titles = data.data
-            .map((a) => a.title)
-            .filter(Boolean);
+        if (Array.isArray(data)) {
+          const titles = data.map((a) => a.title).filter(Boolean);
           setAnimeSuggestions(titles);
         } else {
           setAnimeSuggestions([]);
@@ -98,20 +98,16 @@ function MoviesPage() {
     const controller = new AbortController();
     const timeoutId = window.setTimeout(async () => {
       try {
+        // Suggest titles spelled exactly as in the recommendation dataset
         const response = await fetch(
-          `https://api.themoviedb.org/3/search/movie?api_key=${API_KEY}&language=en-US&query=${encodeURIComponent(
-            query
-          )}&page=1&include_adult=false`,
+          `http://localhost:5000/movies/suggest?q=${encodeURIComponent(query)}&limit=8`,
           { signal: controller.signal }
         );
 
         const data = await response.json();
 
-        if (data && Array.isArray(data.results)) {
-          const titles = data.results
-            .slice(0, 8)
-            .map((m) => m.title)
-            .filter(Boolean);
+        if (Array.isArray(data)) {
+          const titles = data.map((m) => m.title).filter(Boolean);
           setMovieSuggestions(titles);
         } else {
           setMovieSuggestions([]);
@@ -127,7 +123,7 @@ function MoviesPage() {
       controller.abort();
       window.clearTimeout(timeoutId);
     };
-  }, [inputTitle, API_KEY, suppressSuggestions]);
+  }, [inputTitle, suppressSuggestions]);
 
   const handleSearch = async () => {
     if (!inputTitle.trim()) {